@@ -18,6 +18,7 @@ from .utils.pd_to_walker import pd_to_walker
 
 from .tools.map.population_api import get_population_api_info
 from .tools.custom_tools_def import get_api_result
+from .tools.tool_memo import ToolMemo
 
 IMPORTANT_MODULE = ["import math"]
 THIRD_MODULE = ["import pandas as pd", "import numpy as np", "import geopy"]
@@ -46,7 +47,7 @@ def get_cot_code_prompt(question):
         """
 
     if query_database in function_set:
-        data_prompt = get_db_info_prompt(engine, simple=True)
+        data_prompt = get_db_info_prompt(engine, simple=True, question=question)
         database = "\nThe database content: \n" + data_prompt + "\n"
 
     pre_prompt = """ 
@@ -95,15 +96,48 @@ def func():
     return cot_prompt, rag_ans, function_import
 
 
-def cot_agent(question, retries=2, print_rows=10):
-    exp = None
+def render_cot_item(item, print_rows=10):
+    """
+    Render one item yielded by the generated func() as markdown.
+    Returns (kind, markdown), kind is one of "dataframe", "image", "iframe", "text".
+    """
+    if isinstance(item, pd.DataFrame):
+        if item.index.size > 10:
+            cot_ans = df_to_markdown(item.head(print_rows)) + \
+                      "\nfirst {} rows of {}\n".format(print_rows, len(item))
+        else:
+            cot_ans = df_to_markdown(item)
+        html_link = pd_to_walker(item)
+        # cot_ans += wrap_html_url_with_markdown_link(html_link)
+        cot_ans += wrap_html_url_with_html_a(html_link)
+        return "dataframe", cot_ans
+    elif isinstance(item, str) and is_png_url(item):
+        return "image", "\n" + wrap_png_url_with_markdown_image(item) + "\n"
+    elif is_iframe_tag(str(item)):
+        return "iframe", "\n" + str(item) + "\n"
+    else:
+        return "text", "\n" + str(item) + "\n"
+
+
+def cot_agent_stream(question, retries=2, print_rows=10):
+    """
+    Same pipeline as cot_agent, but yields (event, data) pairs as soon as they are produced:
+    - ("step", {"kind", "content"}): one rendered item yielded by the generated code
+    - ("retry", {"error"}): the generated code failed, steps sent so far are discarded
+    - ("review", {"content"}): the answer review
+    - ("done", {"ans", "map"}): the full answer, same as cot_agent returns
+    - ("error", {"msg"}): all retries failed
+    Tool calls are memoized across the retries, so a retry only pays for the steps that changed.
+    """
+    memo = ToolMemo()
     for i in range(3):
         html_map = ""
         cot_prompt, rag_ans, function_import = get_cot_code_prompt(question)
         print(rag_ans)
         # print(cot_prompt)
         if cot_prompt == "solved":
-            return rag_ans, None
+            yield "done", {"ans": rag_ans, "map": None}
+            return
         else:
             err_msg = ""
             for j in range(retries):
@@ -117,42 +151,41 @@ def cot_agent(question, retries=2, print_rows=10):
                 if code is None:
                     continue
                 try:
-                    result = execute_py_code(code)
+                    result = execute_py_code(code, memo=memo)
                     cot_ans = ""
                     for item in result:
-                        # print(item)
-                        if isinstance(item, pd.DataFrame):
-                            if item.index.size > 10:
-                                cot_ans += df_to_markdown(item.head(print_rows)) + \
-                                           "\nfirst {} rows of {}\n".format(print_rows, len(item))
-                            else:
-                                cot_ans += df_to_markdown(item)
-                            html_link = pd_to_walker(item)
-                            # cot_ans += wrap_html_url_with_markdown_link(html_link)
-                            cot_ans += wrap_html_url_with_html_a(html_link)
-                        elif isinstance(item, str) and is_png_url(item):
-                            cot_ans += "\n" + wrap_png_url_with_markdown_image(item) + "\n"
-                        elif is_iframe_tag(str(item)):
+                        kind, item_ans = render_cot_item(item, print_rows)
+                        if kind == "iframe":
                             html_map = str(item)
-                            cot_ans += "\n" + str(item) + "\n"
-                        else:
-                            cot_ans += "\n" + str(item) + "\n"
+                        cot_ans += item_ans
                         print(item)
+                        yield "step", {"kind": kind, "content": item_ans}
 
                     ans = "### Base knowledge: \n" + rag_ans + "\n\n"
                     ans += "### COT Result: \n" + cot_ans + "\n"
                     # print(ans)
                     review_ans = get_ans_review(question, ans, code)
+                    yield "review", {"content": review_ans}
                     ans += "## Summarize and review: \n" + review_ans + "\n"
 
                     logging.info(f"Question: {question}\nAnswer: {ans}\nCode: {code}\n")
+                    logging.info(f"Tool calls served from memo: {memo.hits} of {memo.hits + memo.misses}")
+                    print(f"Tool calls served from memo: {memo.hits} of {memo.hits + memo.misses}")
 
-                    return ans, html_map
+                    yield "done", {"ans": ans, "map": html_map, "tool_memo": memo.stats()}
+                    return
                 except Exception as e:
                     err_msg = str(e) + "\n```python\n" + code + "\n```\n"
-                    exp = e
                     print(e)
+                    yield "retry", {"error": str(e)}
                     continue
+    yield "error", {"msg": "处理失败，请换个问法吧"}
+
+
+def cot_agent(question, retries=2, print_rows=10):
+    for event, data in cot_agent_stream(question, retries, print_rows):
+        if event == "done":
+            return data["ans"], data["map"]
     return None, None
 
 
@@ -5,6 +5,9 @@ from .utils.read_db import get_table_creation_statements, get_rows_from_all_tabl
 from .utils.call_llm_test import call_llm
 from .utils.parse_output import parse_generated_sql_code
 from .utils.read_db import execute_select
+from .utils.schema_index import select_relevant_tables, estimate_tokens, get_full_prompt_tokens
+from utils.get_config import config_data
+from agent.utils.llm_access.llm_cache import drop_cached_answer
 
 # tables = ['class', 'lesson_info',
 #           'semester', 'stu_detail', 'stu_grade',
@@ -12,7 +15,7 @@ from .utils.read_db import execute_select
 tables = None
 
 
-def get_db_info_prompt(engine, simple=False, example=False):
+def build_db_info_prompt(engine, tables, simple=False, example=False):
     data_prompt = """
 Here is the structure of the database:
 """
@@ -29,35 +32,63 @@ Here is data samples(just samples, do not mock any data):
     return data_prompt
 
 
-def get_sql_code(question, df_cols, llm, engine, retries=3):
-    retries_times = 0
-    error_msg = ""
-    # print(get_table_creation_statements(engine, tables))
-    # print(get_table_and_column_comments(engine, tables))
-    # print(get_rows_from_all_tables(engine, tables, 3))
-    while retries_times <= retries:
-        retries_times += 1
-        pre_prompt = """
+def get_db_info_prompt(engine, simple=False, example=False, question=None):
+    """
+    Build the database description prompt.
+    If question is provided, only the tables relevant to it (and their foreign key neighbours) are included.
+    """
+    relevant_tables = select_relevant_tables(engine, question) if question else None
+    if relevant_tables is None:
+        return build_db_info_prompt(engine, tables, simple, example)
+
+    data_prompt = build_db_info_prompt(engine, relevant_tables, simple, example)
+    full_tokens = get_full_prompt_tokens(engine, lambda: build_db_info_prompt(engine, tables, simple, example),
+                                         variant=(simple, example))
+    logging.info(f"schema prompt pruned to {relevant_tables}, "
+                 f"tokens {full_tokens} -> {estimate_tokens(data_prompt)}")
+    return data_prompt
+
+
+def get_sql_prompt(question, df_cols, engine):
+    pre_prompt = """
 Please write SQL code to select the data needed according to the following requirements:
 """
 
-        data_prompt = get_db_info_prompt(engine, example=True)
+    data_prompt = get_db_info_prompt(engine, example=True, question=question)
 
-        if df_cols:
-            data_prompt += "With output columns names: \n"
-            data_prompt += str(df_cols) + "\n"
+    if df_cols:
+        data_prompt += "With output columns names: \n"
+        data_prompt += str(df_cols) + "\n"
 
-        end_prompt = """
+    end_prompt = """
 Remind:
 1. All code should be completed in a single markdown code block without any comments, explanations or cmds.
 """
-        final_prompt = question + pre_prompt + "\n" + data_prompt + end_prompt
+    return question + pre_prompt + "\n" + data_prompt + end_prompt
+
+
+def get_sql_code(question, df_cols, llm, engine, retries=3, db_error=""):
+    """
+    db_error: error of the previous SQL from the database, added to the question. Prompts with it are not cached.
+    """
+    retries_times = 0
+    error_msg = ""
+    # print(get_table_creation_statements(engine, tables))
+    # print(get_table_and_column_comments(engine, tables))
+    # print(get_rows_from_all_tables(engine, tables, 3))
+    while retries_times <= retries:
+        retries_times += 1
+        final_prompt = get_sql_prompt(question + db_error, df_cols, engine)
 
-        ans = call_llm(final_prompt + error_msg, llm)
+        # only the first clean attempt is cached, retries carry error messages
+        cacheable = not error_msg and not db_error
+        ans = call_llm(final_prompt + error_msg, llm, cache="sql_code" if cacheable else None)
         print("sql################################3")
         print(ans.content)
         result_sql = parse_generated_sql_code(ans.content)
         if result_sql is None:
+            if cacheable:
+                drop_cached_answer(final_prompt, config_data["model_name"])
             error_msg = """
 code should only be in a md code block: 
 ```sql
@@ -76,7 +107,7 @@ def query_database_func(question, df_cols, llm, engine, retries=2):
     for i in range(retries):
         err_msg = ""
         for j in range(retries):
-            sql = get_sql_code(question + err_msg, df_cols, llm, engine)
+            sql = get_sql_code(question, df_cols, llm, engine, db_error=err_msg)
             # print(sql)
             if sql is None:
                 continue
@@ -85,6 +116,9 @@ def query_database_func(question, df_cols, llm, engine, retries=2):
                 logging.info(f"query_database_SQL: {sql}\nQuestion: {question}\nResult: {result}\n")
                 return result
             except Exception as e:
+                if not err_msg:
+                    # do not serve a failing SQL from the cache next time
+                    drop_cached_answer(get_sql_prompt(question, df_cols, engine), config_data["model_name"])
                 err_msg = str(e)
                 exp = e
                 print(e)
@@ -1,11 +1,34 @@
+import inspect
+
 from .parse_output import assert_skip
+from . import sandbox
+from agent.tools.tool_memo import set_active_memo, iterate_with_memo
 
 from agent.tools.tools_def import * #保留这一行，没错
 
 
+def run_py_code_with_data(code, data):
+    """
+    在当前进程中执行生成的代码 func(data) 并返回结果。
+    """
+    local_namespace = {'data': data, 'result': None}
+    exec(code, globals(), local_namespace)
+    return local_namespace['func'](data)
+
+
+def run_py_code(code):
+    """
+    在当前进程中执行生成的代码 func() 并返回结果（通常是生成器）。
+    """
+    local_namespace = {'result': None}
+    exec(code, globals(), local_namespace)
+    return local_namespace['func']()
+
+
 def execute_py_code_with_data(code, data, assert_func=assert_skip):
     """
     执行生成的代码并返回结果。
+    启用沙箱时在独立的工作进程中执行，带有超时和内存限制。
 
     :param code: 生成的Python代码
     :param data: 输入数据
@@ -13,9 +36,10 @@ def execute_py_code_with_data(code, data, assert_func=assert_skip):
     :return: 执行结果，如果执行成功且通过断言则返回结果，否则返回None
     """
     try:
-        local_namespace = {'data': data, 'result': None}
-        exec(code, globals(), local_namespace)
-        result = local_namespace['func'](data)
+        if sandbox.SANDBOX_ENABLED and not sandbox.IN_SANDBOX:
+            result = sandbox.run_py_code_with_data_in_sandbox(code, data)
+        else:
+            result = run_py_code_with_data(code, data)
         assert_result = assert_func(result)
         if assert_result:
             raise Exception(assert_result)
@@ -25,18 +49,27 @@ def execute_py_code_with_data(code, data, assert_func=assert_skip):
         raise e
 
 
-def execute_py_code(code, assert_func=assert_skip):
+def execute_py_code(code, assert_func=assert_skip, memo=None):
     """
     执行生成的代码并返回结果。
+    启用沙箱时在独立的工作进程中执行，生成器的每个 yield 通过管道流式返回。
 
     :param code: 生成的Python代码
     :param assert_func: 断言函数，用于验证结果
+    :param memo: ToolMemo，同一问题的多次重试共享工具调用结果
     :return: 执行结果，如果执行成功且通过断言则返回结果，否则返回None
     """
     try:
-        local_namespace = {'result': None}
-        exec(code, globals(), local_namespace)
-        result = local_namespace['func']()
+        if sandbox.SANDBOX_ENABLED and not sandbox.IN_SANDBOX:
+            result = sandbox.run_py_code_in_sandbox(code, memo)
+        else:
+            previous = set_active_memo(memo)
+            try:
+                result = run_py_code(code)
+            finally:
+                set_active_memo(previous)
+            if memo is not None and inspect.isgenerator(result):
+                result = iterate_with_memo(result, memo)
         assert_result = assert_func(result)
         if assert_result:
             raise Exception(assert_result)
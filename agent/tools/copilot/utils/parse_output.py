@@ -6,7 +6,7 @@ import pandas
 def parse_output_img(txt):
     try:
         # 定义正则表达式模式
-        pattern = r"tmp_imgs/[^\s/]+\.png"
+        pattern = r"tmp_imgs/(?:[^\s/]+/)?[^\s/]+\.png"
         matched_paths = re.findall(pattern, str(txt))
     except Exception as e:
         print("parsing err", e)
@@ -21,7 +21,7 @@ def parse_output_img(txt):
 def parse_output_html(txt):
     try:
         # 定义正则表达式模式
-        pattern = r"tmp_imgs/[^\s/]+\.html"
+        pattern = r"tmp_imgs/(?:[^\s/]+/)?[^\s/]+\.html"
         matched_paths = re.findall(pattern, str(txt))
     except Exception as e:
         print("parsing err", e)
@@ -1,56 +1,297 @@
+import re
+import threading
+import time
+
 import pandas as pd
 from sqlalchemy import text, inspect
 from sqlalchemy.exc import SQLAlchemyError
 
+from agent.utils.get_config import config_data
+
 tables_data = None
 
+schema_config = config_data.get("schema_cache") or {}
+SCHEMA_CACHE_TTL = schema_config.get("ttl", 600)  # seconds, rebuild at least this often
+SCHEMA_PROBE_INTERVAL = schema_config.get("probe_interval", 10)  # seconds between data version probes
 
-def get_all_table_names(engine):
-    inspector = inspect(engine)
-    return inspector.get_table_names()
+# engine url -> schema snapshot
+_schema_cache = {}
+_schema_lock = threading.Lock()
 
 
-def get_rows_from_all_tables(engine, tables, num=3):
-    # 获取所有表名
+def get_data_version(engine):
+    """
+    A cheap probe that changes when tables are created, altered or written.
+    Returns None if the dialect has no such probe, then only the TTL applies.
+    """
+    try:
+        with engine.connect() as connection:
+            if engine.dialect.name == "mysql":
+                row = connection.execute(text("""
+                    SELECT COUNT(*), MAX(CREATE_TIME), MAX(UPDATE_TIME), SUM(TABLE_ROWS)
+                    FROM information_schema.tables WHERE table_schema = DATABASE()
+                """)).fetchone()
+                return tuple(str(i) for i in row)
+            if engine.dialect.name == "sqlite":
+                return connection.execute(text("PRAGMA schema_version")).scalar()
+    except SQLAlchemyError as e:
+        print(f"An error occurred while probing data version: {e}")
+    return None
+
+
+def _mysql_column_line(quote, column_name, column_type, is_nullable, column_default, extra):
+    """
+    The SHOW CREATE TABLE line of a column from its information_schema values.
+    """
+    line = f"  {quote(column_name)} {column_type}"
+    if is_nullable != "YES":
+        line += " NOT NULL"
+    extra = extra or ""
+    if column_default is not None:
+        if column_default.upper().startswith("CURRENT_TIMESTAMP"):
+            line += f" DEFAULT {column_default}"
+        elif "DEFAULT_GENERATED" in extra.upper():
+            # MySQL 8 expression default
+            line += f" DEFAULT ({column_default})"
+        else:
+            line += " DEFAULT '{}'".format(column_default.replace("'", "''"))
+    on_update = re.search(r"on update (\S+)", extra, re.IGNORECASE)
+    if on_update:
+        line += f" ON UPDATE {on_update.group(1)}"
+    if "auto_increment" in extra.lower():
+        line += " AUTO_INCREMENT"
+    return line
+
+
+def _parse_mysql_columns(engine, table_name, columns):
+    """
+    Parse the information_schema columns of a table with the MySQL dialect's SHOW CREATE TABLE parser,
+    so that types and defaults are the same as inspector.get_columns returns (INTEGER, DEFAULT 'abc').
+    Raises ValueError if a column could not be parsed.
+    """
+    # _tabledef_parser is a private attribute of the SQLAlchemy 2.0 MySQL dialect (checked with 2.0.36),
+    # _load_schema falls back to the inspector if it is gone or parses differently in another version
+    parser = engine.dialect._tabledef_parser
+    quote = engine.dialect.identifier_preparer.quote_identifier
+    lines = [_mysql_column_line(quote, *column[:5]) for column in columns]
+    create_sql = f"CREATE TABLE {quote(table_name)} (\n" + ",\n".join(lines) + "\n) "
+    state = parser.parse(create_sql, getattr(engine.dialect, "_connection_charset", None))
+    # the parser only warns about the lines it does not understand and skips them
+    if len(state.columns) != len(columns):
+        raise ValueError(f"parsed {len(state.columns)} of {len(columns)} columns of {table_name}")
+    comments = {column[0]: column[5] or None for column in columns}
+    for column in state.columns:
+        column["comment"] = comments.get(column["name"])
+    return state.columns
+
+
+def _load_schema_bulk(engine):
+    """
+    Load the schema of all tables from information_schema in three set-based queries (MySQL),
+    returning the same shaped dicts as the SQLAlchemy inspector.
+    """
+    schema = {}
+    with engine.connect() as connection:
+        table_rows = connection.execute(text("""
+            SELECT TABLE_NAME, TABLE_COMMENT FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+            ORDER BY TABLE_NAME
+        """)).fetchall()
+        column_rows = connection.execute(text("""
+            SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA, COLUMN_COMMENT
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """)).fetchall()
+        key_rows = connection.execute(text("""
+            SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+            FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE()
+            ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+        """)).fetchall()
+
+    table_names = []
+    for table_name, table_comment in table_rows:
+        table_names.append(table_name)
+        schema[table_name] = {
+            "columns": [],
+            "primary_keys": {"constrained_columns": [], "name": None},
+            "foreign_keys": [],
+            "comment": {"text": table_comment or None},
+        }
+
+    table_columns = {}
+    for row in column_rows:
+        if row[0] in schema:
+            table_columns.setdefault(row[0], []).append(row[1:])
+    for table_name, columns in table_columns.items():
+        schema[table_name]["columns"] = _parse_mysql_columns(engine, table_name, columns)
+
+    foreign_keys = {}
+    for table_name, constraint_name, column_name, referred_table, referred_column in key_rows:
+        if table_name not in schema:
+            continue
+        if constraint_name == "PRIMARY":
+            schema[table_name]["primary_keys"]["constrained_columns"].append(column_name)
+            schema[table_name]["primary_keys"]["name"] = constraint_name
+        elif referred_table is not None:
+            fk = foreign_keys.get((table_name, constraint_name))
+            if fk is None:
+                fk = {
+                    "name": constraint_name,
+                    "constrained_columns": [],
+                    "referred_table": referred_table,
+                    "referred_columns": [],
+                }
+                foreign_keys[(table_name, constraint_name)] = fk
+                schema[table_name]["foreign_keys"].append(fk)
+            fk["constrained_columns"].append(column_name)
+            fk["referred_columns"].append(referred_column)
+
+    return table_names, schema
+
+
+def _load_schema(engine):
+    if engine.dialect.name == "mysql":
+        try:
+            return _load_schema_bulk(engine)
+        except (SQLAlchemyError, AttributeError, ValueError) as e:
+            # AttributeError / ValueError: the private column parser changed, see _parse_mysql_columns
+            print(f"An error occurred while loading schema from information_schema: {e}")
     inspector = inspect(engine)
+    table_names = inspector.get_table_names()
+    schema = {}
+    for table_name in table_names:
+        try:
+            table_comment = inspector.get_table_comment(table_name)
+        except NotImplementedError:
+            table_comment = {"text": None}
+        schema[table_name] = {
+            "columns": inspector.get_columns(table_name),
+            "primary_keys": inspector.get_pk_constraint(table_name),
+            "foreign_keys": inspector.get_foreign_keys(table_name),
+            "comment": table_comment,
+        }
+    return table_names, schema
+
+
+def get_schema_snapshot(engine):
+    """
+    Return the cached schema of the database, rebuilt when the data version probe changes or the TTL expires.
+    The snapshot holds table names, columns, primary keys, foreign keys, table comments and sample rows.
+    """
+    key = str(engine.url)
+    now = time.time()
+    with _schema_lock:
+        snapshot = _schema_cache.get(key)
+        if snapshot is not None and now - snapshot["loaded_at"] < SCHEMA_CACHE_TTL:
+            if now - snapshot["checked_at"] < SCHEMA_PROBE_INTERVAL:
+                return snapshot
+            version = get_data_version(engine)
+            snapshot["checked_at"] = now
+            if version is not None and version == snapshot["version"]:
+                return snapshot
+        else:
+            version = get_data_version(engine)
+
+        table_names, schema = _load_schema(engine)
+        snapshot = {
+            "table_names": table_names,
+            "tables": schema,
+            "rows": {},
+            "version": version,
+            "loaded_at": now,
+            "checked_at": now,
+        }
+        _schema_cache[key] = snapshot
+        return snapshot
+
+
+def invalidate_schema_cache(engine=None):
+    with _schema_lock:
+        if engine is None:
+            _schema_cache.clear()
+        else:
+            _schema_cache.pop(str(engine.url), None)
+
+
+def _get_table_names(engine, tables):
     if not tables:
-        table_names = inspector.get_table_names()
-    else:
-        table_names = tables
+        return get_schema_snapshot(engine)["table_names"]
+    return tables
 
-    # 准备一个字典来存储每个表的前5行数据
-    first_five_rows = {}
 
-    # 遍历所有表名
-    for table_name in table_names:
-        try:
-            # 构造查询语句，限制返回5行
-            query = text(f"SELECT * FROM {table_name} LIMIT {num}")
+def _get_table_schema(engine, table_name):
+    snapshot = get_schema_snapshot(engine)
+    table_schema = snapshot["tables"].get(table_name)
+    if table_schema is None:
+        # not in the snapshot, e.g. a table outside the default schema
+        inspector = inspect(engine)
+        table_schema = {
+            "columns": inspector.get_columns(table_name),
+            "primary_keys": inspector.get_pk_constraint(table_name),
+            "foreign_keys": inspector.get_foreign_keys(table_name),
+            "comment": inspector.get_table_comment(table_name),
+        }
+    return table_schema
 
-            # 使用 pandas 读取查询结果
-            with engine.connect() as connection:
+
+def get_all_table_names(engine):
+    return list(get_schema_snapshot(engine)["table_names"])
+
+
+def _fetch_rows(engine, table_names, num):
+    rows = {}
+    # 所有表共用一个连接
+    with engine.connect() as connection:
+        # 遍历所有表名
+        for table_name in table_names:
+            try:
+                # 构造查询语句，限制返回num行
+                query = text(f"SELECT * FROM {table_name} LIMIT {num}")
+
+                # 使用 pandas 读取查询结果
                 df = pd.read_sql(query, connection)
 
-            # 将结果存储到字典中
-            first_five_rows[table_name] = df
+                # 将结果存储到字典中
+                rows[table_name] = df
 
-        except SQLAlchemyError as e:
-            # 如果发生错误，打印错误信息并继续处理下一个表
-            print(f"An error occurred while fetching data from table {table_name}: {e}")
-            continue
+            except SQLAlchemyError as e:
+                # 如果发生错误，打印错误信息并继续处理下一个表
+                print(f"An error occurred while fetching data from table {table_name}: {e}")
+                connection.rollback()
+                continue
+    return rows
+
+
+def get_rows_from_all_tables(engine, tables, num=3):
+    snapshot = get_schema_snapshot(engine)
+    table_names = _get_table_names(engine, tables)
+
+    # 样例数据按行数缓存在快照中
+    cached_rows = snapshot["rows"].get(num)
+    if cached_rows is None:
+        cached_rows = _fetch_rows(engine, snapshot["table_names"], num)
+        snapshot["rows"][num] = cached_rows
+
+    first_five_rows = {}
+    missing_tables = []
+    for table_name in table_names:
+        if table_name in cached_rows:
+            first_five_rows[table_name] = cached_rows[table_name]
+        elif table_name not in snapshot["tables"]:
+            missing_tables.append(table_name)
+    if missing_tables:
+        first_five_rows.update(_fetch_rows(engine, missing_tables, num))
 
     return first_five_rows
 
 
 def get_foreign_keys(engine, tables):
-    inspector = inspect(engine)
-    if not tables:
-        table_names = inspector.get_table_names()
-    else:
-        table_names = tables
+    table_names = _get_table_names(engine, tables)
     foreign_keys = {}
     for table_name in table_names:
-        fks = inspector.get_foreign_keys(table_name)
+        fks = _get_table_schema(engine, table_name)["foreign_keys"]
         if fks:
             foreign_keys[table_name] = {}
             for fk in fks:
@@ -62,22 +303,19 @@ def get_foreign_keys(engine, tables):
 
 
 def get_table_and_column_comments(engine, tables):
-    inspector = inspect(engine)
-    if not tables:
-        table_names = inspector.get_table_names()
-    else:
-        table_names = tables
+    table_names = _get_table_names(engine, tables)
     table_comments = {}
     column_comments = {}
 
     for table_name in table_names:
-        table_comment = inspector.get_table_comment(table_name)
+        table_schema = _get_table_schema(engine, table_name)
+        table_comment = table_schema["comment"]
         if table_comment['text'] is not None:
             table_comments[table_name] = table_comment['text']
-        columns = inspector.get_columns(table_name)
+        columns = table_schema["columns"]
         column_comments[table_name] = {}
         for column in columns:
-            if column['comment'] is not None:
+            if column.get('comment') is not None:
                 column_comments[table_name][column['name']] = column['comment']
         if not column_comments[table_name]:
             del column_comments[table_name]
@@ -86,20 +324,17 @@ def get_table_and_column_comments(engine, tables):
 
 
 def get_table_creation_statements(engine, tables, simple=False):
-    inspector = inspect(engine)
-    if not tables:
-        table_names = inspector.get_table_names()
-    else:
-        table_names = tables
+    table_names = _get_table_names(engine, tables)
     creation_statements = {}
 
     for table_name in table_names:
+        table_schema = _get_table_schema(engine, table_name)
         # 获取表的列信息
-        columns = inspector.get_columns(table_name)
+        columns = table_schema["columns"]
         # 获取表的主键信息
-        primary_keys = inspector.get_pk_constraint(table_name)
+        primary_keys = table_schema["primary_keys"]
         # 获取表的外键信息
-        foreign_keys = inspector.get_foreign_keys(table_name)
+        foreign_keys = table_schema["foreign_keys"]
         # 获取表的索引信息
         # indexes = inspector.get_indexes(table_name)
 
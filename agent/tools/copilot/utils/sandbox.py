@@ -0,0 +1,332 @@
+import importlib
+import inspect
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+from agent.utils.get_config import config_data
+from agent.utils.sqlite_cache import add_stats_deltas
+
+sandbox_config = config_data.get("sandbox") or {}
+SANDBOX_ENABLED = sandbox_config.get("enabled", True)
+SANDBOX_WORKERS = sandbox_config.get("workers", 2)
+SANDBOX_TIMEOUT = sandbox_config.get("timeout", 300)  # seconds of wall clock per run
+SANDBOX_MAX_RSS_MB = sandbox_config.get("max_rss_mb", 2048)
+SANDBOX_MAX_RUNS = sandbox_config.get("max_runs", 20)  # recycle a worker after this many runs
+# address space limit set inside the worker, larger than max_rss_mb as the libraries reserve virtual memory
+SANDBOX_MAX_VM_MB = sandbox_config.get("max_vm_mb", 8192)
+SANDBOX_MAX_ITEMS = sandbox_config.get("max_items", 1000)  # items one run may yield
+
+# modules imported by every worker before it accepts code
+WARM_MODULES = [
+    "pandas",
+    "numpy",
+    "matplotlib",
+    "matplotlib.pyplot",
+    "agent.tools.tools_def",
+    "agent.tools.custom_tools_def",
+    "agent.tools.copilot.utils.code_executor",
+]
+
+# "module:function" called by every worker after the imports, to load in-memory indexes
+WARM_CALLS = [
+    "agent.tools.db.spatial_index:warm_spatial_index",
+]
+
+POLL_INTERVAL = 0.2
+
+# True inside a worker process, code there runs in-process
+IN_SANDBOX = False
+
+_ctx = multiprocessing.get_context("spawn")
+
+
+class SandboxError(Exception):
+    """
+    An exception raised by the generated code inside a worker.
+    str() is the original message so that it can be fed back to the LLM unchanged.
+    """
+
+    def __init__(self, type_name, message, tb=""):
+        super().__init__(message)
+        self.type_name = type_name
+        self.tb = tb
+
+
+class SandboxTimeout(Exception):
+    pass
+
+
+class SandboxMemoryError(Exception):
+    pass
+
+
+def _safe_send(conn, tag, payload):
+    try:
+        conn.send((tag, payload))
+    except Exception:
+        # objects that can not be pickled are sent as their string form
+        conn.send((tag, str(payload)))
+
+
+def _set_memory_limit(max_vm_mb):
+    if not max_vm_mb or sys.platform == "win32":
+        return
+    import resource
+    limit = int(max_vm_mb) * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        print(f"Sandbox worker failed to set the memory limit: {e}")
+
+
+def _worker_main(conn, warm_modules, warm_calls=(), max_vm_mb=0):
+    global IN_SANDBOX
+    IN_SANDBOX = True
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    for module_name in warm_modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"Sandbox worker failed to import {module_name}: {e}")
+    for call in warm_calls:
+        try:
+            module_name, func_name = call.split(":")
+            getattr(importlib.import_module(module_name), func_name)()
+        except Exception as e:
+            print(f"Sandbox worker failed to run {call}: {e}")
+    from agent.tools.copilot.utils import code_executor
+    from agent.tools.tool_memo import set_active_memo
+    from agent.utils.sqlite_cache import take_stats_deltas
+
+    # the generated code gets a MemoryError instead of growing until the parent notices
+    _set_memory_limit(max_vm_mb)
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        kind, code, args, memo = message
+        # tool calls made by the code are memoized in the memo sent with the run, it is sent back at the end
+        previous = set_active_memo(memo)
+        try:
+            if kind == "with_data":
+                result = code_executor.run_py_code_with_data(code, *args)
+            else:
+                result = code_executor.run_py_code(code)
+            if inspect.isgenerator(result):
+                for item in result:
+                    _safe_send(conn, "item", item)
+                conn.send(("done", (memo, take_stats_deltas())))
+            else:
+                _safe_send(conn, "result", result)
+                conn.send(("done", (memo, take_stats_deltas())))
+        except Exception as e:
+            conn.send(("error", (type(e).__name__, str(e), traceback.format_exc(), memo, take_stats_deltas())))
+        finally:
+            set_active_memo(previous)
+
+
+def _get_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class SandboxWorker:
+    def __init__(self):
+        self.conn, child_conn = _ctx.Pipe()
+        self.process = _ctx.Process(target=_worker_main,
+                                    args=(child_conn, WARM_MODULES, WARM_CALLS, SANDBOX_MAX_VM_MB), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.ready = False
+
+    def wait_ready(self, timeout):
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise SandboxTimeout("Sandbox worker did not start in time")
+        tag, _ = self.conn.recv()
+        self.ready = tag == "ready"
+
+    def recv(self, deadline):
+        while True:
+            # checked before every message too, code that yields without pause never lets poll time out
+            if time.time() > deadline:
+                raise SandboxTimeout(f"Code execution timed out after {SANDBOX_TIMEOUT} seconds")
+            rss = _get_rss_mb(self.process.pid)
+            if SANDBOX_MAX_RSS_MB and rss is not None and rss > SANDBOX_MAX_RSS_MB:
+                raise SandboxMemoryError(f"Code execution used {rss:.0f}MB memory, over the {SANDBOX_MAX_RSS_MB}MB limit")
+            if self.conn.poll(POLL_INTERVAL):
+                return self.conn.recv()
+            if not self.process.is_alive():
+                raise SandboxError("WorkerDied", f"Sandbox worker exited with code {self.process.exitcode}")
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(5)
+        except Exception as e:
+            print(f"Error killing sandbox worker: {e}")
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(5)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.kill()
+
+
+class SandboxPool:
+    def __init__(self, size):
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._count = 0
+        self._closed = False
+
+    def warm(self):
+        """
+        Start all workers ahead of the first request.
+        """
+        while True:
+            with self._lock:
+                if self._count >= self.size:
+                    return
+                self._count += 1
+            self._idle.put(SandboxWorker())
+
+    def acquire(self, timeout):
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            worker = None
+            with self._lock:
+                if self._count < self.size:
+                    self._count += 1
+                    worker = SandboxWorker()
+            if worker is None:
+                try:
+                    worker = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise SandboxTimeout("No sandbox worker available")
+        try:
+            worker.wait_ready(timeout)
+        except Exception:
+            self.release(worker, healthy=False)
+            raise
+        return worker
+
+    def release(self, worker, healthy=True):
+        if healthy:
+            worker.runs += 1
+            if worker.runs < SANDBOX_MAX_RUNS:
+                self._idle.put(worker)
+                return
+        with self._lock:
+            self._count -= 1
+        # stopping a worker and starting another takes seconds, the caller may be a request thread or the event loop
+        threading.Thread(target=self._replace, args=(worker, healthy), name="sandbox-replace", daemon=True).start()
+
+    def _replace(self, worker, healthy):
+        if healthy:
+            worker.stop()
+        else:
+            worker.kill()
+        # start a fresh worker so the pool stays warm, unless acquire already started one in its place
+        with self._lock:
+            if self._closed or self._count >= self.size:
+                return
+            self._count += 1
+        self._idle.put(SandboxWorker())
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+        with self._lock:
+            self._count = 0
+
+
+pool = SandboxPool(SANDBOX_WORKERS)
+
+
+def _run(kind, code, args, memo=None):
+    """
+    Send code to a worker and yield ("item", obj) / ("result", obj) messages until it finishes.
+    The worker is killed if the caller stops early, on timeout or over the memory limit.
+    """
+    worker = pool.acquire(SANDBOX_TIMEOUT)
+    healthy = False
+    try:
+        worker.conn.send((kind, code, args, memo))
+        deadline = time.time() + SANDBOX_TIMEOUT
+        items = 0
+        while True:
+            tag, payload = worker.recv(deadline)
+            if tag in ("item", "result"):
+                items += 1
+                if SANDBOX_MAX_ITEMS and items > SANDBOX_MAX_ITEMS:
+                    raise SandboxError("TooManyItems", f"Code yielded more than {SANDBOX_MAX_ITEMS} items")
+                yield tag, payload
+            elif tag == "done":
+                healthy = True
+                worker_memo, stats_deltas = payload
+                # cache hits and misses counted in the worker are reported by the API process
+                add_stats_deltas(stats_deltas)
+                if memo is not None and worker_memo is not None:
+                    memo.update_from(worker_memo)
+                return
+            elif tag == "error":
+                healthy = True
+                type_name, message, tb, worker_memo, stats_deltas = payload
+                add_stats_deltas(stats_deltas)
+                if memo is not None and worker_memo is not None:
+                    memo.update_from(worker_memo)
+                raise SandboxError(type_name, message, tb)
+    finally:
+        pool.release(worker, healthy)
+
+
+def run_py_code_in_sandbox(code, memo=None):
+    """
+    Run generated code defining func() in a worker, yield what func() yields.
+    """
+    for tag, payload in _run("plain", code, (), memo):
+        if tag == "item":
+            yield payload
+        else:
+            # func() returned a value instead of yielding
+            yield from payload
+
+
+def run_py_code_with_data_in_sandbox(code, data):
+    """
+    Run generated code defining func(data) in a worker and return its result.
+    """
+    result = None
+    for tag, payload in _run("with_data", code, (data,)):
+        if tag == "result":
+            result = payload
+    return result
@@ -0,0 +1,153 @@
+import math
+import re
+import threading
+from collections import Counter
+
+from agent.utils.get_config import config_data
+from .read_db import get_schema_snapshot
+
+prune_config = config_data.get("schema_prune") or {}
+PRUNE_ENABLED = prune_config.get("enabled", True)
+PRUNE_TOP_K = prune_config.get("top_k", 5)
+
+# weights of the table name / column names / comments in a table document
+NAME_WEIGHT = 3
+COLUMN_WEIGHT = 1
+COMMENT_WEIGHT = 1
+# extra score when the question names the table explicitly
+MENTION_BOOST = 10.0
+
+_index_lock = threading.Lock()
+# engine url -> (snapshot loaded_at, index)
+_index_cache = {}
+
+
+def tokenize(s):
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", str(s).lower()):
+        # 简单的复数处理: schools -> school
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def estimate_tokens(s):
+    """
+    Rough token count of a prompt, words and punctuation marks are counted as one token each.
+    """
+    return len(re.findall(r"\w+|[^\w\s]", s))
+
+
+def _build_index(snapshot):
+    docs = {}
+    neighbours = {name: set() for name in snapshot["table_names"]}
+    for table_name in snapshot["table_names"]:
+        table_schema = snapshot["tables"][table_name]
+        tf = Counter()
+        for token in tokenize(table_name):
+            tf[token] += NAME_WEIGHT
+        comment = table_schema["comment"].get("text")
+        for token in tokenize(comment or ""):
+            tf[token] += COMMENT_WEIGHT
+        for column in table_schema["columns"]:
+            for token in tokenize(column["name"]):
+                tf[token] += COLUMN_WEIGHT
+            for token in tokenize(column.get("comment") or ""):
+                tf[token] += COMMENT_WEIGHT
+        docs[table_name] = tf
+
+        # 外键关系双向记录
+        for fk in table_schema["foreign_keys"]:
+            referred_table = fk["referred_table"]
+            neighbours[table_name].add(referred_table)
+            neighbours.setdefault(referred_table, set()).add(table_name)
+
+    doc_freq = Counter()
+    for tf in docs.values():
+        doc_freq.update(tf.keys())
+    total = len(docs)
+    idf = {token: math.log(1 + (total - df + 0.5) / (df + 0.5)) for token, df in doc_freq.items()}
+    lengths = {name: sum(tf.values()) for name, tf in docs.items()}
+    avg_length = (sum(lengths.values()) / total) if total else 0.0
+    return {
+        "docs": docs,
+        "idf": idf,
+        "lengths": lengths,
+        "avg_length": avg_length,
+        "neighbours": neighbours,
+        "table_names": list(snapshot["table_names"]),
+        # (simple, example) -> token estimate of the unpruned prompt, see get_full_prompt_tokens
+        "full_prompt_tokens": {},
+    }
+
+
+def get_schema_index(engine):
+    snapshot = get_schema_snapshot(engine)
+    key = str(engine.url)
+    with _index_lock:
+        cached = _index_cache.get(key)
+        if cached is None or cached[0] != snapshot["loaded_at"]:
+            cached = (snapshot["loaded_at"], _build_index(snapshot))
+            _index_cache[key] = cached
+        return cached[1]
+
+
+def get_full_prompt_tokens(engine, build_prompt, variant=None):
+    """
+    Token estimate of the unpruned schema prompt, computed once per schema snapshot and variant.
+    build_prompt() returns the full prompt, it is only called when the estimate is not cached.
+    """
+    index = get_schema_index(engine)
+    with _index_lock:
+        tokens = index["full_prompt_tokens"].get(variant)
+    if tokens is None:
+        tokens = estimate_tokens(build_prompt())
+        with _index_lock:
+            index["full_prompt_tokens"][variant] = tokens
+    return tokens
+
+
+def rank_tables(index, question, k1=1.5, b=0.75):
+    """
+    Score each table against the question with BM25 over its name, columns and comments.
+    """
+    query_tokens = set(tokenize(question))
+    question_lower = str(question).lower()
+    scores = {}
+    for table_name, tf in index["docs"].items():
+        score = 0.0
+        length_norm = 1 - b + b * index["lengths"][table_name] / (index["avg_length"] or 1)
+        for token in query_tokens:
+            freq = tf.get(token)
+            if freq:
+                score += index["idf"][token] * freq * (k1 + 1) / (freq + k1 * length_norm)
+        if re.search(r"\b" + re.escape(table_name.lower()) + r"\b", question_lower):
+            score += MENTION_BOOST
+        scores[table_name] = score
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+def select_relevant_tables(engine, question, top_k=None):
+    """
+    Select the top-k tables relevant to the question plus their foreign key neighbours.
+    Returns None when pruning does not apply and all tables should be used.
+    """
+    if not PRUNE_ENABLED or not question:
+        return None
+    top_k = top_k or PRUNE_TOP_K
+    index = get_schema_index(engine)
+    if len(index["table_names"]) <= top_k:
+        return None
+
+    ranked = rank_tables(index, question)
+    selected = [table_name for table_name, score in ranked[:top_k] if score > 0]
+    if not selected:
+        return None
+
+    for table_name in list(selected):
+        for neighbour in sorted(index["neighbours"].get(table_name, ())):
+            if neighbour not in selected and neighbour in index["docs"]:
+                selected.append(neighbour)
+    # keep the database order so that prompts stay stable for the LLM cache
+    return [table_name for table_name in index["table_names"] if table_name in selected]
@@ -5,13 +5,20 @@ import pandas as pd
 from matplotlib import pyplot as plt
 
 from agent.utils.llm_access.LLM import get_llm
-from .copilot.examples.path_tools import generate_img_path
-from .llm_analysis.llm_predict_hdb import llm_predict_hdb_func, get_llm_predict_hdb_info
+from agent.utils.artifact_store import artifact_store
+from .llm_analysis.llm_predict_hdb import llm_predict_hdb_func, get_llm_predict_hdb_info, get_prediction_range
+from .prediction.hdb_forecast import stat_predict_hdb_func
 
-from .tools_def import engine, STATIC_URL
+from .tools_def import engine
+from .tool_memo import memoize_tool
 
 llm = get_llm()
 
+from agent.utils.get_config import config_data
+
+# "stat": local damped-trend forecast, "llm": ask the LLM to predict the prices
+HDB_FORECAST_MODE = (config_data.get("hdb_forecast") or {}).get("mode", "stat")
+
 from .map.get_onemap_minimap import get_minimap_func
 from .map.utils.api_call import get_api_result_func
 from .db.query_db import find_schools_near_postcode_func, get_hdb_info_by_postcode
@@ -86,6 +93,7 @@ def get_minimap(
     return html
 
 
+@memoize_tool
 def get_api_result(url: str) -> dict | list:
     """
     get_api_result(url: str) -> dict | list:
@@ -108,9 +116,10 @@ def get_api_result(url: str) -> dict | list:
     return result
 
 
-from .prediction.Model_Deploy3 import predict_house_price
+from .prediction.Model_Deploy3 import predict_house_price_batch
 
 
+@memoize_tool
 def house_price_prediction_model(from_date: str, to_date: str, storey_range="", planarea="",
                                  flat_type="", flat_model="", street_name="",
                                  floor_area_sqm=84, lease_commence_date="",
@@ -165,29 +174,24 @@ def house_price_prediction_model(from_date: str, to_date: str, storey_range="",
     """
     # Generate monthly date range
     date_range = pd.date_range(start=from_date, end=to_date, freq='MS').strftime("%Y-%m")
-    predictions = []
-    for month in date_range:
-        sample_input = {
-            "month": month,
-            "storey_range": storey_range,
-            "town": planarea,
-            "flat_type": flat_type,
-            "flat_model": flat_model,
-            "street_name": street_name,
-            "floor_area_sqm": floor_area_sqm,
-            "lease_commence_date": lease_commence_date,
-            "remaining_lease": remaining_lease
-        }
-        pred, features_used, processed = predict_house_price(sample_input)
-        predictions.append({
-            "month": month,
-            "predicted_price": pred[0]
-        })
+    # One row per month, predicted in a single batch
+    batch_input = pd.DataFrame({
+        "month": list(date_range),
+        "storey_range": storey_range,
+        "town": planarea,
+        "flat_type": flat_type,
+        "flat_model": flat_model,
+        "street_name": street_name,
+        "floor_area_sqm": floor_area_sqm,
+        "lease_commence_date": lease_commence_date,
+        "remaining_lease": remaining_lease
+    })
+    predictions = predict_house_price_batch(batch_input)
     # Create DataFrame and sort by month
-    result_df = pd.DataFrame(predictions)
+    result_df = predictions[["month", "predicted_price"]]
     result_df = result_df.sort_values("month")
 
-    path = generate_img_path()
+    path = artifact_store.new_path(".png")
 
     plt.figure(figsize=(10, 6))
     plt.plot(result_df['month'], result_df['predicted_price'], marker='o', linestyle='-', color='b')
@@ -199,10 +203,12 @@ def house_price_prediction_model(from_date: str, to_date: str, storey_range="",
     plt.tight_layout()
     plt.savefig(path, dpi=300, bbox_inches='tight')
     plt.close()
+    artifact_store.register(path)
 
-    return result_df, STATIC_URL + path[2:]
+    return result_df, artifact_store.url(path)
 
 
+@memoize_tool
 def find_schools_near_postcode(postcode: str, radius_km: float = 2.0) -> pd.DataFrame:
     """
     find_schools_near_postcode(postcode: str, radius_km: float = 2.0) -> pd.DataFrame:
@@ -245,6 +251,7 @@ def find_schools_near_postcode(postcode: str, radius_km: float = 2.0) -> pd.Data
     return pd.DataFrame(school_list)
 
 
+@memoize_tool
 def find_preschools_near_postcode(postcode: str, radius_km: float = 2.0) -> pd.DataFrame:
     """
     find_preschools_near_postcode(postcode: str, radius_km: float = 2.0) -> pd.DataFrame:
@@ -285,6 +292,7 @@ def find_preschools_near_postcode(postcode: str, radius_km: float = 2.0) -> pd.D
     return pd.DataFrame(preschool_list)
 
 
+@memoize_tool
 def get_hdb_info(postcode: str, storey_range="",
                  flat_type="", flat_model="",
                  floor_area_sqm=0, lease_commence_date="") -> dict:
@@ -347,6 +355,7 @@ def get_hdb_info(postcode: str, storey_range="",
     return hdb_info
 
 
+@memoize_tool
 def predict_hdb_price(from_date: str = None, to_date: str = None, plan_area=None, blk_no=None, street=None,
                       flat_model=None, flat_type=None, storey_range=None,
                       floor_area_sqm_from=None, floor_area_sqm_to=None,
@@ -404,22 +413,33 @@ data_description = explain_data(original_question + "please describe the given r
 yield data_description
 ```
     """
-    predict_df = llm_predict_hdb_func(engine=engine, llm=llm, from_date=from_date, to_date=to_date,
-                                      plan_area=plan_area, blk_no=blk_no, street=street,
-                                      flat_model=flat_model, flat_type=flat_type, storey_range=storey_range,
-                                      floor_area_sqm_from=floor_area_sqm_from, floor_area_sqm_to=floor_area_sqm_to,
-                                      lease_commence_date_from=lease_commence_date_from,
-                                      lease_commence_date_to=lease_commence_date_to)
-    search_conditions, hdb_price_history, sample = get_llm_predict_hdb_info(engine,
-                                                                            plan_area=plan_area, blk_no=blk_no,
-                                                                            street=street,
-                                                                            flat_model=flat_model, flat_type=flat_type,
-                                                                            storey_range=storey_range,
-                                                                            floor_area_sqm_from=floor_area_sqm_from,
-                                                                            floor_area_sqm_to=floor_area_sqm_to,
-                                                                            lease_commence_date_from=lease_commence_date_from,
-                                                                            lease_commence_date_to=lease_commence_date_to)
-    path = generate_img_path()
+    # Fetch the price history once, it is used both for the prompt and for the plot
+    hdb_info = get_llm_predict_hdb_info(engine,
+                                        plan_area=plan_area, blk_no=blk_no,
+                                        street=street,
+                                        flat_model=flat_model, flat_type=flat_type,
+                                        storey_range=storey_range,
+                                        floor_area_sqm_from=floor_area_sqm_from,
+                                        floor_area_sqm_to=floor_area_sqm_to,
+                                        lease_commence_date_from=lease_commence_date_from,
+                                        lease_commence_date_to=lease_commence_date_to)
+    search_conditions, hdb_price_history, sample = hdb_info
+    predict_df = None
+    if HDB_FORECAST_MODE != "llm":
+        from_date, to_date = get_prediction_range(engine, from_date, to_date)
+        try:
+            predict_df = stat_predict_hdb_func(hdb_price_history, from_date, to_date)
+        except ValueError as e:
+            print(f"Statistical forecast not available, falling back to LLM: {e}")
+    if predict_df is None:
+        predict_df = llm_predict_hdb_func(engine=engine, llm=llm, from_date=from_date, to_date=to_date,
+                                          plan_area=plan_area, blk_no=blk_no, street=street,
+                                          flat_model=flat_model, flat_type=flat_type, storey_range=storey_range,
+                                          floor_area_sqm_from=floor_area_sqm_from, floor_area_sqm_to=floor_area_sqm_to,
+                                          lease_commence_date_from=lease_commence_date_from,
+                                          lease_commence_date_to=lease_commence_date_to,
+                                          hdb_info=hdb_info)
+    path = artifact_store.new_path(".png")
 
     import matplotlib.pyplot as plt
     import pandas as pd
@@ -493,6 +513,7 @@ yield data_description
     plt.tight_layout()
     plt.savefig(path)
     plt.close()
+    artifact_store.register(path)
 
     # # Convert to datetime for proper plotting
     # history_df = pd.DataFrame(hdb_price_history)
@@ -527,4 +548,4 @@ yield data_description
     # plt.savefig(path)
     # plt.close()
 
-    return predict_df, STATIC_URL + path[2:]
+    return predict_df, artifact_store.url(path)
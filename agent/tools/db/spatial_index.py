@@ -0,0 +1,250 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import sqlalchemy
+
+from agent.utils.get_config import config_data
+
+spatial_config = config_data.get("spatial_index") or {}
+SPATIAL_INDEX_TTL = spatial_config.get("ttl", 86400)  # seconds, reload the coordinates at least this often
+CELL_DEG = spatial_config.get("cell_deg", 0.01)  # grid cell size in degrees, about 1.1km
+
+EARTH_RADIUS_KM = 6371
+
+_index_lock = threading.Lock()
+# serializes the first load, so that concurrent first lookups query the database once
+_load_lock = threading.Lock()
+# engine url -> SpatialIndex
+_index_cache = {}
+# engine urls being reloaded in the background
+_refreshing = set()
+
+
+def postcode_key(postcode):
+    """
+    Normalize a postcode for lookup, numeric postcodes match with or without leading zeros like in MySQL.
+    """
+    s = str(postcode).strip()
+    if s.isdigit():
+        return s.lstrip("0") or "0"
+    return s.upper()
+
+
+def great_circle_km(lat, lng, lats, lngs):
+    """
+    Distance in km from (lat, lng) to each of (lats, lngs), the spherical law of cosines used by the SQL queries.
+    """
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    cos_angle = np.cos(lat1) * np.cos(lat2) * np.cos(lng2 - lng1) + np.sin(lat1) * np.sin(lat2)
+    return EARTH_RADIUS_KM * np.arccos(np.clip(cos_angle, -1.0, 1.0))
+
+
+class PointGrid:
+    """
+    Uniform lat/lng grid over a set of points for bounding box and nearest neighbour queries.
+    """
+
+    def __init__(self, lats, lngs, cell_deg=CELL_DEG):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.cell_deg = cell_deg
+        cells = defaultdict(list)
+        for i, (lat, lng) in enumerate(zip(self.lats, self.lngs)):
+            cells[self._cell(lat, lng)].append(i)
+        self.cells = {cell: np.array(ids, dtype=np.int64) for cell, ids in cells.items()}
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def in_box(self, lat, lng, half_deg):
+        """
+        Indices of the points with both lat and lng within half_deg of (lat, lng), bounds included.
+        """
+        lat_lo, lng_lo = self._cell(lat - half_deg, lng - half_deg)
+        lat_hi, lng_hi = self._cell(lat + half_deg, lng + half_deg)
+        candidates = [
+            self.cells[(i, j)]
+            for i in range(lat_lo, lat_hi + 1)
+            for j in range(lng_lo, lng_hi + 1)
+            if (i, j) in self.cells
+        ]
+        if not candidates:
+            return np.array([], dtype=np.int64)
+        ids = np.sort(np.concatenate(candidates))
+        mask = ((self.lats[ids] >= lat - half_deg) & (self.lats[ids] <= lat + half_deg)
+                & (self.lngs[ids] >= lng - half_deg) & (self.lngs[ids] <= lng + half_deg))
+        return ids[mask]
+
+    def nearest(self, lat, lng, k):
+        """
+        Indices and distances in km of the k points nearest to (lat, lng), nearest first.
+        """
+        if len(self.lats) == 0 or k <= 0:
+            return np.array([], dtype=np.int64), np.array([])
+        distances = great_circle_km(lat, lng, self.lats, self.lngs)
+        k = min(k, len(distances))
+        ids = np.argpartition(distances, k - 1)[:k]
+        ids = ids[np.argsort(distances[ids], kind="stable")]
+        return ids, distances[ids]
+
+
+class SpatialIndex:
+    """
+    In-memory coordinates of postcodes, schools and preschools.
+    """
+
+    def __init__(self, postcodes, schools, preschools):
+        self.postcodes = postcodes
+        self.schools = schools
+        self.preschools = preschools
+        self.school_grid = PointGrid([s["latitude"] for s in schools], [s["longitude"] for s in schools])
+        self.preschool_grid = PointGrid([p["latitude"] for p in preschools], [p["longitude"] for p in preschools])
+        self.loaded_at = time.time()
+
+    def locate(self, postcode):
+        return self.postcodes.get(postcode_key(postcode))
+
+    def schools_within(self, lat, lng, radius_km, limit=50):
+        """
+        Schools within radius_km of (lat, lng) sorted by distance, with 'distance_km' added.
+        """
+        # same bounding box prefilter as the SQL query (1km ~ 0.009 degrees)
+        ids = self.school_grid.in_box(lat, lng, radius_km * 0.009)
+        distances = great_circle_km(lat, lng, self.school_grid.lats[ids], self.school_grid.lngs[ids])
+        keep = distances <= radius_km
+        ids, distances = ids[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")[:limit]
+        return [dict(self.schools[ids[i]], distance_km=float(distances[i])) for i in order]
+
+    def preschools_within(self, lat, lng, radius_km, limit=20):
+        """
+        Preschools in the bounding box of radius_km around (lat, lng), nearest first, with 'distance_km' added.
+        """
+        radius_deg = radius_km * 0.009
+        ids = self.preschool_grid.in_box(lat, lng, radius_deg)
+        # 与原 SQL 相同的排序值: radius_deg * 经纬度欧氏距离
+        distances = np.sqrt((radius_deg * (self.preschool_grid.lats[ids] - lat)) ** 2
+                            + (radius_deg * (self.preschool_grid.lngs[ids] - lng)) ** 2)
+        order = np.argsort(distances, kind="stable")[:limit]
+        return [dict(self.preschools[ids[i]], distance_km=float(distances[i])) for i in order]
+
+    def nearest_schools(self, lat, lng, k=10):
+        ids, distances = self.school_grid.nearest(lat, lng, k)
+        return [dict(self.schools[i], distance_km=float(d)) for i, d in zip(ids, distances)]
+
+    def nearest_preschools(self, lat, lng, k=10):
+        ids, distances = self.preschool_grid.nearest(lat, lng, k)
+        return [dict(self.preschools[i], distance_km=float(d)) for i, d in zip(ids, distances)]
+
+
+def _load_spatial_index(engine):
+    start = time.time()
+    conn = engine.connect()
+    try:
+        postcodes = {}
+        result = conn.execute(sqlalchemy.text("""
+            SELECT postcode, latitude, longitude FROM singapore_postcode
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """))
+        for postcode, latitude, longitude in result:
+            # 与 LIMIT 1 一致，重复的邮编取第一条
+            postcodes.setdefault(postcode_key(postcode), (float(latitude), float(longitude)))
+
+        result = conn.execute(sqlalchemy.text("""
+            SELECT
+                s.school_name,
+                s.address,
+                s.postcode,
+                s.telephone_no,
+                s.email_address,
+                sp.latitude,
+                sp.longitude
+            FROM school s
+            JOIN singapore_postcode sp ON s.postcode = sp.PostCode
+            WHERE sp.latitude IS NOT NULL AND sp.longitude IS NOT NULL
+        """))
+        schools = [{
+            "school_name": row[0],
+            "address": row[1],
+            "postcode": row[2],
+            "telephone": row[3],
+            "email": row[4],
+            "latitude": float(row[5]),
+            "longitude": float(row[6]),
+        } for row in result]
+
+        result = conn.execute(sqlalchemy.text("""
+            SELECT centre_name, centre_code, latitude, longitude FROM preschool_location
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """))
+        preschools = [{
+            "centre_name": row[0],
+            "centre_code": row[1],
+            "latitude": float(row[2]),
+            "longitude": float(row[3]),
+        } for row in result]
+    except Exception as e:
+        print(f"Error loading spatial index: {e}")
+        raise e
+    finally:
+        conn.close()
+
+    index = SpatialIndex(postcodes, schools, preschools)
+    print(f"Spatial index loaded in {time.time() - start:.2f}s: {len(postcodes)} postcodes, "
+          f"{len(schools)} schools, {len(preschools)} preschools")
+    return index
+
+
+def get_spatial_index(engine):
+    """
+    Return the spatial index of the database, loaded on first use.
+    After the TTL the current index is still returned while a new one is loaded in the background.
+    """
+    key = str(engine.url)
+    index = _index_cache.get(key)
+    if index is None:
+        with _load_lock:
+            index = _index_cache.get(key)
+            if index is None:
+                index = refresh_spatial_index(engine)
+        return index
+    if time.time() - index.loaded_at >= SPATIAL_INDEX_TTL:
+        with _index_lock:
+            start_refresh = key not in _refreshing
+            _refreshing.add(key)
+        if start_refresh:
+            threading.Thread(target=_refresh_in_background, args=(engine, key), daemon=True).start()
+    return index
+
+
+def _refresh_in_background(engine, key):
+    try:
+        refresh_spatial_index(engine)
+    except Exception as e:
+        print(f"Spatial index not reloaded: {e}")
+    finally:
+        with _index_lock:
+            _refreshing.discard(key)
+
+
+def refresh_spatial_index(engine):
+    """
+    Reload the coordinates from the database, e.g. after the school or postcode tables were updated.
+    The new index is built without holding the lock and swapped in at once, lookups keep using the old one.
+    """
+    index = _load_spatial_index(engine)
+    with _index_lock:
+        _index_cache[str(engine.url)] = index
+    return index
+
+
+def warm_spatial_index():
+    from agent.tools.tools_def import engine
+    try:
+        get_spatial_index(engine)
+    except Exception as e:
+        print(f"Spatial index not loaded: {e}")
@@ -69,7 +69,7 @@ draw_graph, query_database
 
 def get_function_info(question, llm):
     function_prompt = get_function_prompt(question)
-    function_list_str = call_llm(function_prompt, llm).content
+    function_list_str = call_llm(function_prompt, llm, cache="function_select").content
     if function_list_str == "solved":
         return {}, "solved", []
     function_list = [part.strip() for part in function_list_str.split(',')]
@@ -1,5 +1,88 @@
+import copy
+import threading
+
 import sqlalchemy
 
+from agent.tools.tool_memo import normalize_arg
+from agent.utils.get_config import config_data
+from agent.utils.sqlite_cache import SqliteCache
+
+# 结果行数不超过该值时直接返回原始成交记录，否则在数据库中按月聚合
+RAW_ROWS_LIMIT = 50
+
+history_cache_config = config_data.get("hdb_history_cache") or {}
+HISTORY_CACHE_ENABLED = history_cache_config.get("enabled", True)
+# shared by the sandbox workers, which each run one job at a time and can not share an in-flight query
+history_cache = SqliteCache(history_cache_config.get("path", "./cache/hdb_history.sqlite3"),
+                            table="hdb_history",
+                            ttl=history_cache_config.get("ttl", 300),
+                            max_entries=history_cache_config.get("max_entries", 500))
+
+
+def build_resale_filters(month=None, plan_area=None, flat_type=None, blk_no=None,
+                         street=None, storey_range=None, floor_area_sqm_from=None, floor_area_sqm_to=None,
+                         flat_model=None, lease_commence_date_from=None, lease_commence_date_to=None,
+                         resale_price=None):
+    """
+    Build the WHERE clause (starting with "WHERE 1=1") and its parameters for resale_flat_prices.
+    """
+    query = " WHERE 1=1"
+    params = {}
+
+    # Add conditions for each parameter if provided
+    if month is not None:
+        query += " AND month = :month"
+        params['month'] = month
+    if plan_area is not None:
+        query += " AND planarea = :planarea"
+        params['planarea'] = plan_area
+    if flat_type is not None:
+        query += " AND flat_type = :flat_type"
+        params['flat_type'] = flat_type
+    if blk_no is not None:
+        query += " AND blk_no = :blk_no"
+        params['blk_no'] = blk_no
+    if street is not None:
+        query += " AND street = :street"
+        params['street'] = street
+    if storey_range is not None:
+        query += " AND storey_range = :storey_range"
+        params['storey_range'] = storey_range
+
+    # Handle floor area range
+    if floor_area_sqm_from is not None and floor_area_sqm_to is not None:
+        query += " AND floor_area_sqm BETWEEN :floor_area_from AND :floor_area_to"
+        params['floor_area_from'] = floor_area_sqm_from
+        params['floor_area_to'] = floor_area_sqm_to
+    elif floor_area_sqm_from is not None:
+        query += " AND floor_area_sqm >= :floor_area_from"
+        params['floor_area_from'] = floor_area_sqm_from
+    elif floor_area_sqm_to is not None:
+        query += " AND floor_area_sqm <= :floor_area_to"
+        params['floor_area_to'] = floor_area_sqm_to
+
+    if flat_model is not None:
+        query += " AND flat_model = :flat_model"
+        params['flat_model'] = flat_model
+
+    # Handle lease commence date range
+    if lease_commence_date_from is not None and lease_commence_date_to is not None:
+        query += " AND lease_commence_date BETWEEN :lease_commence_date_from AND :lease_commence_date_to"
+        params['lease_commence_date_from'] = lease_commence_date_from
+        params['lease_commence_date_to'] = lease_commence_date_to
+    elif lease_commence_date_from is not None:
+        query += " AND lease_commence_date >= :lease_commence_date_from"
+        params['lease_commence_date_from'] = lease_commence_date_from
+    elif lease_commence_date_to is not None:
+        query += " AND lease_commence_date <= :lease_commence_date_to"
+        params['lease_commence_date_to'] = lease_commence_date_to
+
+    if resale_price is not None:
+        query += " AND resale_price = :resale_price"
+        params['resale_price'] = resale_price
+
+    return query, params
+
 
 def query_resale_flats(engine, month=None, plan_area=None, flat_type=None, blk_no=None,
                        street=None, storey_range=None, floor_area_sqm_from=None, floor_area_sqm_to=None,
@@ -7,60 +90,14 @@ def query_resale_flats(engine, month=None, plan_area=None, flat_type=None, blk_n
     conn = engine.connect()
     try:
         # Base query
-        query = "SELECT * FROM resale_flat_prices WHERE 1=1"
-        params = {}
-
-        # Add conditions for each parameter if provided
-        if month is not None:
-            query += " AND month = :month"
-            params['month'] = month
-        if plan_area is not None:
-            query += " AND planarea = :planarea"
-            params['planarea'] = plan_area
-        if flat_type is not None:
-            query += " AND flat_type = :flat_type"
-            params['flat_type'] = flat_type
-        if blk_no is not None:
-            query += " AND blk_no = :blk_no"
-            params['blk_no'] = blk_no
-        if street is not None:
-            query += " AND street = :street"
-            params['street'] = street
-        if storey_range is not None:
-            query += " AND storey_range = :storey_range"
-            params['storey_range'] = storey_range
-
-        # Handle floor area range
-        if floor_area_sqm_from is not None and floor_area_sqm_to is not None:
-            query += " AND floor_area_sqm BETWEEN :floor_area_from AND :floor_area_to"
-            params['floor_area_from'] = floor_area_sqm_from
-            params['floor_area_to'] = floor_area_sqm_to
-        elif floor_area_sqm_from is not None:
-            query += " AND floor_area_sqm >= :floor_area_from"
-            params['floor_area_from'] = floor_area_sqm_from
-        elif floor_area_sqm_to is not None:
-            query += " AND floor_area_sqm <= :floor_area_to"
-            params['floor_area_to'] = floor_area_sqm_to
-
-        if flat_model is not None:
-            query += " AND flat_model = :flat_model"
-            params['flat_model'] = flat_model
-
-        # Handle lease commence date range
-        if lease_commence_date_from is not None and lease_commence_date_to is not None:
-            query += " AND lease_commence_date BETWEEN :lease_commence_date_from AND :lease_commence_date_to"
-            params['lease_commence_date_from'] = lease_commence_date_from
-            params['lease_commence_date_to'] = lease_commence_date_to
-        elif lease_commence_date_from is not None:
-            query += " AND lease_commence_date >= :lease_commence_date_from"
-            params['lease_commence_date_from'] = lease_commence_date_from
-        elif lease_commence_date_to is not None:
-            query += " AND lease_commence_date <= :lease_commence_date_to"
-            params['lease_commence_date_to'] = lease_commence_date_to
-
-        if resale_price is not None:
-            query += " AND resale_price = :resale_price"
-            params['resale_price'] = resale_price
+        where, params = build_resale_filters(
+            month=month, plan_area=plan_area, flat_type=flat_type, blk_no=blk_no,
+            street=street, storey_range=storey_range,
+            floor_area_sqm_from=floor_area_sqm_from, floor_area_sqm_to=floor_area_sqm_to,
+            flat_model=flat_model,
+            lease_commence_date_from=lease_commence_date_from, lease_commence_date_to=lease_commence_date_to,
+            resale_price=resale_price)
+        query = "SELECT * FROM resale_flat_prices" + where
 
         result = conn.execute(sqlalchemy.text(query), params)
 
@@ -74,6 +111,61 @@ def query_resale_flats(engine, month=None, plan_area=None, flat_type=None, blk_n
         conn.close()
 
 
+def query_resale_flats_monthly(engine, **filters):
+    """
+    Aggregate the matching resale transactions per month in the database.
+    Returns a list of {'month': 'YYYY-MM', 'avg_resale_price', 'original_count'} sorted by month,
+    so that the transfer scales with the number of months instead of transactions.
+    """
+    conn = engine.connect()
+    try:
+        where, params = build_resale_filters(**filters)
+        query = ("SELECT month, SUM(resale_price) AS total_price, COUNT(*) AS cnt FROM resale_flat_prices"
+                 + where + " GROUP BY month")
+        result = conn.execute(sqlalchemy.text(query), params)
+
+        # month 列可能是具体日期，按 YYYY-MM 再合并一次
+        monthly_data = {}
+        for month, total_price, cnt in result:
+            month = format_month(month)
+            if month not in monthly_data:
+                monthly_data[month] = {'total_price': 0.0, 'count': 0}
+            monthly_data[month]['total_price'] += float(total_price or 0)
+            monthly_data[month]['count'] += int(cnt)
+
+        averaged_data = []
+        for month in sorted(monthly_data):
+            data = monthly_data[month]
+            averaged_data.append({
+                'month': month,
+                'avg_resale_price': data['total_price'] / data['count'],
+                'original_count': data['count']
+            })
+        return averaged_data
+
+    except Exception as e:
+        print(e)
+        raise e
+    finally:
+        conn.close()
+
+
+def format_month(month):
+    """
+    Format a month value (date or "YYYY-MM-DD" string) as "YYYY-MM".
+    """
+    if not month:
+        return month
+    if isinstance(month, str):
+        try:
+            from datetime import datetime
+            dt = datetime.strptime(month, '%Y-%m-%d')
+            return dt.strftime('%Y-%m')
+        except ValueError:
+            return month
+    return month.strftime('%Y-%m')
+
+
 def query_latest_month(engine):
     conn = engine.connect()
     try:
@@ -90,24 +182,94 @@ def query_latest_month(engine):
         conn.close()
 
 
+_inflight_lock = threading.Lock()
+# 正在进行的历史数据查询: key -> {'event', 'result', 'error'}
+# per process: threads of one process share a running query, the sandbox workers share the results in history_cache
+_inflight_history = {}
+
+
 def get_llm_predict_hdb_info(engine, plan_area=None, flat_type=None, blk_no=None,
                              street=None, storey_range=None, floor_area_sqm_from=None,
                              floor_area_sqm_to=None, flat_model=None,
                              lease_commence_date_from=None, lease_commence_date_to=None):
+    """
+    Return (search_conditions, hdb_price_history, sample) for the filters.
+    Concurrent calls with the same normalized filters in one process share one database query,
+    and the result is kept in history_cache for a few minutes for the other processes.
+    """
+    filters = {
+        'plan_area': plan_area,
+        'flat_type': flat_type,
+        'blk_no': blk_no,
+        'street': street,
+        'storey_range': storey_range,
+        'floor_area_sqm_from': floor_area_sqm_from,
+        'floor_area_sqm_to': floor_area_sqm_to,
+        'flat_model': flat_model,
+        'lease_commence_date_from': lease_commence_date_from,
+        'lease_commence_date_to': lease_commence_date_to,
+    }
+    key = (str(engine.url), normalize_arg({k: v for k, v in filters.items() if v is not None}))
+
+    with _inflight_lock:
+        call = _inflight_history.get(key)
+        leader = call is None
+        if leader:
+            call = {'event': threading.Event(), 'result': None, 'error': None}
+            _inflight_history[key] = call
+
+    if not leader:
+        # 等待相同条件的查询完成，共享其结果
+        call['event'].wait()
+        if call['error'] is not None:
+            raise call['error']
+        return copy.deepcopy(call['result'])
 
-    hdb_price_history = query_resale_flats(
-        engine,
-        plan_area=plan_area,
-        flat_type=flat_type,
-        blk_no=blk_no,
-        street=street,
-        storey_range=storey_range,
-        floor_area_sqm_from=floor_area_sqm_from,
-        floor_area_sqm_to=floor_area_sqm_to,
-        flat_model=flat_model,
-        lease_commence_date_from=lease_commence_date_from,
-        lease_commence_date_to=lease_commence_date_to
-    )
+    try:
+        call['result'] = _load_cached_llm_predict_hdb_info(key, engine, filters)
+        return copy.deepcopy(call['result'])
+    except Exception as e:
+        call['error'] = e
+        raise e
+    finally:
+        with _inflight_lock:
+            _inflight_history.pop(key, None)
+        call['event'].set()
+
+
+def _load_cached_llm_predict_hdb_info(key, engine, filters):
+    cache_key = repr(key)
+    if HISTORY_CACHE_ENABLED:
+        cached = history_cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
+    result = _load_llm_predict_hdb_info(engine, **filters)
+    if HISTORY_CACHE_ENABLED:
+        try:
+            history_cache.set(cache_key, result)
+        except (TypeError, ValueError) as e:
+            # raw rows with values JSON can not hold, e.g. Decimal
+            print(f"HDB history not cached: {e}")
+    return result
+
+
+def _load_llm_predict_hdb_info(engine, plan_area=None, flat_type=None, blk_no=None,
+                               street=None, storey_range=None, floor_area_sqm_from=None,
+                               floor_area_sqm_to=None, flat_model=None,
+                               lease_commence_date_from=None, lease_commence_date_to=None):
+
+    filters = {
+        'plan_area': plan_area,
+        'flat_type': flat_type,
+        'blk_no': blk_no,
+        'street': street,
+        'storey_range': storey_range,
+        'floor_area_sqm_from': floor_area_sqm_from,
+        'floor_area_sqm_to': floor_area_sqm_to,
+        'flat_model': flat_model,
+        'lease_commence_date_from': lease_commence_date_from,
+        'lease_commence_date_to': lease_commence_date_to,
+    }
 
     search_conditions = {
         'plan_area': plan_area,
@@ -123,61 +285,37 @@ def get_llm_predict_hdb_info(engine, plan_area=None, flat_type=None, blk_no=None
     }
     search_conditions = {k: v for k, v in search_conditions.items() if v is not None}
 
-    # Format month to YYYY-MM and sort chronologically
-    for record in hdb_price_history:
-        if 'month' in record and record['month']:
-            if isinstance(record['month'], str):
-                try:
-                    from datetime import datetime
-                    dt = datetime.strptime(record['month'], '%Y-%m-%d')
-                    record['month'] = dt.strftime('%Y-%m')
-                except ValueError:
-                    pass
-            else:
-                record['month'] = record['month'].strftime('%Y-%m')
-    hdb_price_history = sorted(hdb_price_history, key=lambda x: x['month'])
-    averaged_data = []
-    sampled_data = None
-
-    if len(hdb_price_history) > 50:
-        monthly_data = {}
+    # Aggregate per month in the database first, the raw rows are only fetched when there are few of them
+    averaged_data = query_resale_flats_monthly(engine, **filters)
+    total_count = sum(record['original_count'] for record in averaged_data)
+
+    if total_count <= RAW_ROWS_LIMIT:
+        hdb_price_history = query_resale_flats(engine, **filters)
+        # Format month to YYYY-MM and sort chronologically
         for record in hdb_price_history:
-            month = record['month']
-            price = record['resale_price']
-            if month not in monthly_data:
-                monthly_data[month] = {
-                    'total_price': 0,
-                    'count': 0,
-                    'records': []
-                }
-            monthly_data[month]['total_price'] += price
-            monthly_data[month]['count'] += 1
-            monthly_data[month]['records'].append(record)
-
-        # Create averaged data
-        averaged_data = []
-        for month, data in monthly_data.items():
-            avg_price = data['total_price'] / data['count']
-            result_record = {
-                'month': month,
-                'avg_resale_price': avg_price,
-                'original_count': data['count']
-            }
-            averaged_data.append(result_record)
+            if 'month' in record and record['month']:
+                record['month'] = format_month(record['month'])
+        hdb_price_history = sorted(hdb_price_history, key=lambda x: x['month'])
+        return search_conditions, hdb_price_history, hdb_price_history  # No averaging or sampling needed
 
-        if len(averaged_data) > 50:
-            sampled_data = []
-            for record in averaged_data:
-                month = record['month']
-                # Check for Q1, Q2, Q3, Q4 months (Jan, Apr, Jul, Oct)
-                if month.endswith(('-01', '-04', '-07', '-10')):
-                    sampled_data.append(record)
+    # hdb_price_history holds the monthly averages instead of every transaction
+    hdb_price_history = averaged_data
+    return search_conditions, hdb_price_history, sample_monthly_history(averaged_data)
 
-            return search_conditions, hdb_price_history, sampled_data
 
-        return search_conditions, hdb_price_history, averaged_data  # sampled_data is None when not reduced
-    else:
-        return search_conditions, hdb_price_history, hdb_price_history  # No averaging or sampling needed
+def sample_monthly_history(averaged_data):
+    """
+    Keep only the first month of each quarter when there are more than 50 months.
+    """
+    if len(averaged_data) > 50:
+        sampled_data = []
+        for record in averaged_data:
+            month = record['month']
+            # Check for Q1, Q2, Q3, Q4 months (Jan, Apr, Jul, Oct)
+            if month.endswith(('-01', '-04', '-07', '-10')):
+                sampled_data.append(record)
+        return sampled_data
+    return averaged_data
 
 
 from .utils.call_llm_test import call_llm
@@ -229,26 +367,11 @@ The prediction must have obvious oscillation and erratic volatility!!!
     return prompt
 
 
-def llm_predict_hdb_func(engine, llm, from_date: str = None, to_date: str = None,
-                         plan_area=None, blk_no=None, street=None,
-                         flat_model=None, flat_type=None, storey_range=None,
-                         floor_area_sqm_from=None, floor_area_sqm_to=None,
-                         lease_commence_date_from=None, lease_commence_date_to=None):
-    # First get the historical data and search conditions
-    search_conditions, hdb_price_history, sample = get_llm_predict_hdb_info(
-        engine,
-        plan_area=plan_area,
-        flat_type=flat_type,
-        blk_no=blk_no,
-        street=street,
-        storey_range=storey_range,
-        floor_area_sqm_from=floor_area_sqm_from,
-        floor_area_sqm_to=floor_area_sqm_to,
-        flat_model=flat_model,
-        lease_commence_date_from=lease_commence_date_from,
-        lease_commence_date_to=lease_commence_date_to
-    )
-
+def get_prediction_range(engine, from_date=None, to_date=None):
+    """
+    Resolve the "YYYY-MM" prediction range: from_date defaults to the month after the latest data,
+    to_date defaults to (and is at least) one year after from_date.
+    """
     if from_date is None:
         latest_month = query_latest_month(engine).strftime("%Y-%m")
         year, month = map(int, latest_month.split('-'))
@@ -267,6 +390,32 @@ def llm_predict_hdb_func(engine, llm, from_date: str = None, to_date: str = None
         to_year, to_month = map(int, to_date.split('-'))
         if (to_year < from_year) or (to_year == from_year and to_month <= from_month):
             to_date = f"{from_year + 1}-{from_month:02d}"
+    return from_date, to_date
+
+
+def llm_predict_hdb_func(engine, llm, from_date: str = None, to_date: str = None,
+                         plan_area=None, blk_no=None, street=None,
+                         flat_model=None, flat_type=None, storey_range=None,
+                         floor_area_sqm_from=None, floor_area_sqm_to=None,
+                         lease_commence_date_from=None, lease_commence_date_to=None, hdb_info=None):
+    # First get the historical data and search conditions, unless the caller already fetched them
+    if hdb_info is None:
+        hdb_info = get_llm_predict_hdb_info(
+            engine,
+            plan_area=plan_area,
+            flat_type=flat_type,
+            blk_no=blk_no,
+            street=street,
+            storey_range=storey_range,
+            floor_area_sqm_from=floor_area_sqm_from,
+            floor_area_sqm_to=floor_area_sqm_to,
+            flat_model=flat_model,
+            lease_commence_date_from=lease_commence_date_from,
+            lease_commence_date_to=lease_commence_date_to
+        )
+    search_conditions, hdb_price_history, sample = hdb_info
+
+    from_date, to_date = get_prediction_range(engine, from_date, to_date)
 
     prompt = get_llm_predict_hdb_prompt(from_date, to_date, search_conditions, sample)
     ans = call_llm(prompt, llm)
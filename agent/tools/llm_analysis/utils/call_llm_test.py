@@ -1,11 +1,20 @@
 from utils.get_config import config_data
+from agent.utils.llm_access.llm_cache import get_cached_answer, set_cached_answer
 
 from datetime import datetime
 import os
 
 log_path = "./agent_log.txt"
 
-def call_llm(question, llm):
+def call_llm(question, llm, cache=None):
+    """
+    cache: name of the call site, set it to reuse answers of identical prompts from the disk cache.
+    """
+    if cache:
+        cached_answer = get_cached_answer(cache, question, config_data["model_name"])
+        if cached_answer is not None:
+            return cached_answer
+
     response = llm.chat.completions.create(
         model=config_data["model_name"],
         messages=[
@@ -29,4 +38,6 @@ def call_llm(question, llm):
     except Exception as e:
         print(f"Error writing to log file: {e}")
 
+    if cache:
+        set_cached_answer(question, config_data["model_name"], answer)
     return answer
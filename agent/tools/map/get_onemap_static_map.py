@@ -3,7 +3,7 @@ import requests
 from PIL import Image
 from io import BytesIO
 
-from .utils.get_onemap_auth import AUTH
+from .utils.get_onemap_auth import get_auth
 
 
 def get_static_map(lat, lon, map_filename="map_image.png"):
@@ -23,10 +23,10 @@ def get_static_map(lat, lon, map_filename="map_image.png"):
 
     # Replace with your actual API token
     headers = {
-        "Authorization": AUTH}
+        "Authorization": get_auth()}
 
     # Make the request
-    response = requests.get(url, headers=headers)
+    response = requests.get(url, headers=headers, timeout=30)
 
     # Check for a successful response
     if response.status_code == 200:
@@ -38,28 +38,29 @@ def calculate_distance_km(coord1: Tuple[float, float],
 
 
 from agent.tools.db.query_db import find_preschools_near_postcode_func, postcode_to_location
-from agent.tools.map.utils.api_call import get_api_result_func
+from agent.tools.map.utils.route_cache import get_routes
 
 
 def find_preschools_in_distance_func(postcode: str, engine, radius_km: float = 2.0):
     # Get preschools within initial straight-line distance
     pre_schools = find_preschools_near_postcode_func(postcode, engine, radius_km)
-    latitude, longitude = postcode_to_location(postcode, engine)
+    location = postcode_to_location(postcode, engine)
 
-    if not latitude or not longitude:
+    if not location or not location[0] or not location[1]:
         raise ValueError(f"Could not find location for postcode {postcode}")
+    latitude, longitude = location
 
-    start_point = f"{latitude},{longitude}"
     result = []
 
-    for preschool in pre_schools:
-        end_point = f"{preschool['latitude']},{preschool['longitude']}"
+    # Get walking route information of all preschools, from the route cache or concurrently from OneMap
+    route_results = get_routes((latitude, longitude),
+                               [(preschool['latitude'], preschool['longitude']) for preschool in pre_schools],
+                               route_type="walk")
 
+    for preschool, route_data in zip(pre_schools, route_results):
         try:
-            # Get walking route information
-            route_data = get_api_result_func(
-                f"/api/public/routingsvc/route?start={start_point}&end={end_point}&routeType=walk"
-            )
+            if isinstance(route_data, Exception):
+                raise route_data
 
             if route_data.get("status") == 0:  # Successful route
                 route_summary = route_data.get("route_summary", {})
@@ -1,9 +1,90 @@
+import os
+import threading
+import time
+
 import sqlalchemy
 from sqlalchemy import create_engine
 from .utils.call_llm_test import call_llm
+from agent.utils.get_config import config_data
 
 engine = create_engine('sqlite:///api_backend/db.sqlite3')
 
+catalog_config = config_data.get("api_catalog") or {}
+# touched by the api_info Django app whenever an ApiInfo / ApiGroup is saved or deleted
+CATALOG_VERSION_FILE = catalog_config.get("version_file", "./api_backend/api_info_version")
+CATALOG_PROBE_INTERVAL = catalog_config.get("probe_interval", 5)  # seconds between version file checks
+CATALOG_TTL = catalog_config.get("ttl", 3600)  # seconds, reload at least this often
+
+_catalog_lock = threading.Lock()
+_catalog = None
+
+
+def _get_catalog_version():
+    try:
+        return os.stat(CATALOG_VERSION_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load_api_catalog():
+    apis = {}
+    groups = {}
+    conn = engine.connect()
+    try:
+        result = conn.execute(sqlalchemy.text("""
+            SELECT api_name, api_description, api_url, api_docs, api_group FROM api_info
+        """))
+        for api_name, api_description, api_url, api_docs, api_group in result.fetchall():
+            apis[api_name] = {
+                "api_description": api_description,
+                "api_url": api_url,
+                "api_docs": api_docs,
+                "api_group": api_group,
+            }
+            groups.setdefault(api_group, []).append(api_name)
+    except Exception as e:
+        print(e)
+        raise e
+    finally:
+        conn.close()
+    return apis, groups
+
+
+def get_api_catalog():
+    """
+    Return the in-memory api_info catalog {"apis": {api_name: info}, "groups": {api_group: [api_name]}},
+    reloaded when the version file changes or after the TTL.
+    """
+    global _catalog
+    now = time.time()
+    with _catalog_lock:
+        catalog = _catalog
+        if catalog is not None and now - catalog["loaded_at"] < CATALOG_TTL:
+            if now - catalog["checked_at"] < CATALOG_PROBE_INTERVAL:
+                return catalog
+            catalog["checked_at"] = now
+            version = _get_catalog_version()
+            if version == catalog["version"]:
+                return catalog
+        else:
+            version = _get_catalog_version()
+
+        apis, groups = _load_api_catalog()
+        _catalog = {
+            "apis": apis,
+            "groups": groups,
+            "version": version,
+            "loaded_at": now,
+            "checked_at": now,
+        }
+        return _catalog
+
+
+def invalidate_api_catalog():
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
 
 def get_api_select_prompt(question:str):
     pre_prompt = """ 
@@ -23,47 +104,43 @@ def get_api_select_prompt(question:str):
     Example 2:
     no
     """
+    catalog = get_api_catalog()
     api_info_dict = {}
-    conn = engine.connect()
-    try:
-        result = conn.execute(sqlalchemy.text("""
-                        SELECT api_name, api_description FROM api_info WHERE api_group='Population Query'
-                                            """),
-                              {})
-        conn.commit()
-        api_info_result = result.fetchall()
-        for api_name, api_description in api_info_result:
-            api_info_dict[api_name] = api_description
-    except Exception as e:
-        print(e)
-        raise e
-    finally:
-        conn.close()
+    for api_name in catalog["groups"].get('Population Query', []):
+        api_info_dict[api_name] = catalog["apis"][api_name]["api_description"]
 
     return "question: "+question+pre_prompt+function_prompt+str(api_info_dict)+example_code
 
 
 def get_population_api_info(question: str, llm):
     api_select_prompt = get_api_select_prompt(question)
-    api_list_str = call_llm(api_select_prompt, llm).content
+    api_list_str = call_llm(api_select_prompt, llm, cache="api_select").content
     api_list = [part.strip() for part in api_list_str.split(',')]
-    placeholders = ', '.join("\'"+i+"\'" for i in api_list)
 
+    catalog = get_api_catalog()
+    api_names = set(api_list)
     api_detail_dict = {}
-    conn = engine.connect()
-    try:
-        result = conn.execute(sqlalchemy.text(f"""
-                            SELECT api_name, api_description, api_url, api_docs FROM api_info WHERE api_name IN ({placeholders})
-                                                """),
-                              {})
-        conn.commit()
-        api_detail_result = result.fetchall()
-        for api_name, api_description, api_url, api_docs in api_detail_result:
-            api_detail_dict[api_name] = api_description+"\n"+api_url+"\n"+api_docs
-    except Exception as e:
-        print(e)
-        raise e
-    finally:
-        conn.close()
-    return api_detail_dict
+    for api_name, info in catalog["apis"].items():
+        if api_name in api_names:
+            api_detail_dict[api_name] = info["api_description"]+"\n"+info["api_url"]+"\n"+info["api_docs"]
 
+    missing = [api_name for api_name in api_list if api_name not in catalog["apis"]]
+    if missing and missing != ["no"]:
+        # the catalog may have changed since it was loaded, look the names up directly
+        conn = engine.connect()
+        try:
+            result = conn.execute(sqlalchemy.text("""
+                                SELECT api_name, api_description, api_url, api_docs FROM api_info WHERE api_name IN :names
+                                                    """).bindparams(sqlalchemy.bindparam("names", expanding=True)),
+                                  {"names": missing})
+            api_detail_result = result.fetchall()
+            for api_name, api_description, api_url, api_docs in api_detail_result:
+                api_detail_dict[api_name] = api_description+"\n"+api_url+"\n"+api_docs
+        except Exception as e:
+            print(e)
+            raise e
+        finally:
+            conn.close()
+        if api_detail_result:
+            invalidate_api_catalog()
+    return api_detail_dict
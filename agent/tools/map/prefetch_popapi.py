@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Prefetch the OneMap population API data into the offline snapshot.
+
+Walks the 'Population Query' APIs of the api_info catalog in api_backend/db.sqlite3 and
+requests each of them for every planning area, year and gender its docs mention.
+The results are stored in the api_snapshot table of the api cache, so that
+get_api_result answers population questions from disk without HTTP.
+
+Run from the project root:
+    python -m agent.tools.map.prefetch_popapi
+    python -m agent.tools.map.prefetch_popapi --years 2015 2020 --api getEconomicStatus
+"""
+
+import argparse
+import itertools
+import time
+from urllib.parse import urlsplit, urlencode
+
+from agent.tools.map.population_api import get_api_catalog
+from agent.tools.map.utils.onemap_client import onemap_client
+from agent.tools.map.utils.api_cache import set_cached_api_result, api_snapshot, normalize_api_url
+
+YEARS = [2000, 2010, 2015, 2020]
+GENDERS = [None, "male", "female"]
+PLANNING_AREA_NAMES_URL = "/api/public/popapi/getPlanningareaNames"
+BATCH_SIZE = 50
+
+
+def get_population_apis():
+    catalog = get_api_catalog()
+    return [(api_name, catalog["apis"][api_name]["api_url"], catalog["apis"][api_name]["api_docs"])
+            for api_name in catalog["groups"].get('Population Query', [])]
+
+
+def get_planning_areas(year):
+    result = onemap_client.get(f"{PLANNING_AREA_NAMES_URL}?year={year}")
+    if not isinstance(result, list):
+        raise ValueError(f"Failed to get the planning area names: {result}")
+    return sorted({item["pln_area_n"] for item in result if item.get("pln_area_n")})
+
+
+def build_urls(api_url, api_docs, planning_areas, years):
+    """
+    All the urls of one API, or [] if its parameters can not be enumerated.
+    """
+    path = urlsplit(api_url.strip()).path
+    docs = api_docs or ""
+    if "latitude" in docs or "longitude" in docs or path == PLANNING_AREA_NAMES_URL:
+        return []
+    param_values = []
+    if "planningArea" in docs:
+        param_values.append([("planningArea", area) for area in planning_areas])
+    if "year" in docs:
+        param_values.append([("year", year) for year in years])
+    if "gender" in docs:
+        param_values.append([("gender", gender) for gender in GENDERS])
+
+    urls = []
+    for combination in itertools.product(*param_values):
+        params = [(k, v) for k, v in combination if v is not None]
+        urls.append(path + ("?" + urlencode(params) if params else ""))
+    return urls
+
+
+def prefetch(years, api_names=None, refresh=False):
+    planning_areas = get_planning_areas(max(years))
+    print(f"{len(planning_areas)} planning areas, years {years}")
+
+    urls = []
+    for api_name, api_url, api_docs in get_population_apis():
+        if api_names and api_name not in api_names and urlsplit(api_url).path.rsplit("/", 1)[-1] not in api_names:
+            continue
+        api_urls = build_urls(api_url, api_docs, planning_areas, years)
+        print(f"{api_name}: {len(api_urls)} requests")
+        urls.extend(api_urls)
+
+    if not refresh:
+        urls = [url for url in urls if api_snapshot.get(normalize_api_url(url)) is None]
+    print(f"Fetching {len(urls)} urls")
+
+    start = time.time()
+    stored = 0
+    for i in range(0, len(urls), BATCH_SIZE):
+        batch = urls[i:i + BATCH_SIZE]
+        for url, result in zip(batch, onemap_client.get_many(batch)):
+            if isinstance(result, Exception) or result is None or (isinstance(result, dict) and "error" in result):
+                print(f"Failed: {url}: {result}")
+                continue
+            set_cached_api_result(url, result, snapshot=True)
+            stored += 1
+        print(f"{min(i + BATCH_SIZE, len(urls))}/{len(urls)} done, {time.time() - start:.1f}s")
+    print(f"Stored {stored} results in the snapshot")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=YEARS, help="census years to fetch")
+    parser.add_argument("--api", nargs="+", help="only these api names or url endpoints")
+    parser.add_argument("--refresh", action="store_true", help="fetch again the urls already in the snapshot")
+    args = parser.parse_args()
+    prefetch(args.years, api_names=args.api, refresh=args.refresh)
+
+
+if __name__ == "__main__":
+    main()
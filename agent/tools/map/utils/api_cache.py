@@ -0,0 +1,70 @@
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from agent.utils.get_config import config_data
+from agent.utils.sqlite_cache import SqliteCache
+
+cache_config = config_data.get("api_cache") or {}
+API_CACHE_ENABLED = cache_config.get("enabled", True)
+# only responses of these url prefixes are cached, e.g. the census-style population data
+CACHED_PREFIXES = cache_config.get("cached_prefixes", ["/api/public/popapi/"])
+API_CACHE_PATH = cache_config.get("path", "./cache/onemap_api.sqlite3")
+
+# query parameters OneMap matches case-insensitively, e.g. planningArea=Bedok and BEDOK
+CASE_INSENSITIVE_PARAMS = {"planningArea", "gender"}
+
+api_cache = SqliteCache(API_CACHE_PATH,
+                        table="api_cache",
+                        ttl=cache_config.get("ttl", 31536000),
+                        max_entries=cache_config.get("max_entries", 100000))
+
+# results stored by the prefetch command, they never expire
+api_snapshot = SqliteCache(API_CACHE_PATH, table="api_snapshot", ttl=0, max_entries=0)
+
+
+def normalize_api_url(url: str):
+    """
+    Normalize a OneMap url for the cache key: relative path, sorted query parameters, empty values dropped,
+    values of CASE_INSENSITIVE_PARAMS in uppercase.
+    """
+    parts = urlsplit(url.strip())
+    params = sorted((k, v.strip().upper() if k in CASE_INSENSITIVE_PARAMS else v.strip())
+                    for k, v in parse_qsl(parts.query) if v.strip())
+    path = parts.path if parts.path.startswith("/") else "/" + parts.path
+    return path + ("?" + urlencode(params) if params else "")
+
+
+def is_cacheable(url: str):
+    return API_CACHE_ENABLED and any(normalize_api_url(url).startswith(prefix) for prefix in CACHED_PREFIXES)
+
+
+def get_cached_api_result(url: str):
+    """
+    Return the stored result of url from the offline snapshot or the response cache, None if there is none.
+    """
+    if not is_cacheable(url):
+        return None
+    key = normalize_api_url(url)
+    result = api_snapshot.get(key)
+    if result is None:
+        result = api_cache.get(key)
+    return result
+
+
+def set_cached_api_result(url: str, result, snapshot=False):
+    if result is None or not is_cacheable(url):
+        return
+    if isinstance(result, dict) and "error" in result:
+        # OneMap reports invalid parameters with an error message, do not keep it
+        return
+    (api_snapshot if snapshot else api_cache).set(normalize_api_url(url), result)
+
+
+def get_api_cache_stats():
+    """
+    Counters of this process, including the get_api_result calls of the generated code in the sandbox workers.
+    Every lookup tries the snapshot first, a snapshot miss can still be a cache hit.
+    """
+    return {
+        "cache": api_cache.stats(),
+        "snapshot": api_snapshot.stats(),
+    }
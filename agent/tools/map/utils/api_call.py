@@ -1,26 +1,21 @@
-from .get_onemap_auth import AUTH
-import requests
+from .onemap_client import onemap_client
+from .api_cache import get_cached_api_result, set_cached_api_result
 
 
 def get_api_result_func(url: str):
-    url="https://www.onemap.gov.sg"+url
-    # Replace with your actual API token
-    headers = {
-        "Authorization": AUTH}
+    # Population data is served from the offline snapshot / response cache when available
+    result_dict = get_cached_api_result(url)
+    if result_dict is not None:
+        return result_dict
 
-    # Make the request
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        # Convert JSON response to a dictionary
-        result_dict = response.json()
+    # Pooled connection with timeout and retries, see onemap_client
+    result_dict = onemap_client.get(url)
+    if result_dict is not None:
         print(result_dict)
         print(type(result_dict))
-        return result_dict
-    else:
-        # Handle the error case
-        print(f"Failed to retrieve data: {response.status_code}")
-        return None
+        set_cached_api_result(url, result_dict)
+    return result_dict
 
 
 if __name__ == "__main__":
-    get_api_result_func("https://www.onemap.gov.sg/api/public/popapi/getEconomicStatus?planningArea=Bedok&year=2010&gender=male")
+    get_api_result_func("/api/public/popapi/getEconomicStatus?planningArea=Bedok&year=2010&gender=male")
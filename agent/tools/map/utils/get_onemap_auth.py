@@ -1,28 +1,122 @@
 import json
+import threading
+import time
 
+import jwt
 import requests
-import os
 
 url = "https://www.onemap.gov.sg/api/auth/post/getToken"
 
-try:
-    with open("./agent/tools/map/utils/onemap_email.txt", "r") as email_file:
+EMAIL_PATH = "./agent/tools/map/utils/onemap_email.txt"
+PASSWORD_PATH = "./agent/tools/map/utils/onemap_password.txt"
+
+# OneMap tokens are valid for 3 days, used when the response has no expiry
+DEFAULT_TOKEN_LIFETIME = 3 * 24 * 3600
+# refresh in the background when the token expires within this many seconds
+REFRESH_MARGIN = 3600
+# wait before fetching again after a failed fetch
+RETRY_INTERVAL = 60
+REQUEST_TIMEOUT = 10
+
+
+def _read_credentials():
+    with open(EMAIL_PATH, "r") as email_file:
         email = email_file.read().strip()
 
-    with open("./agent/tools/map/utils/onemap_password.txt", "r") as password_file:
+    with open(PASSWORD_PATH, "r") as password_file:
         password = password_file.read().strip()
+    return email, password
+
+
+def _get_expiry(data, token):
+    expiry = data.get("expiry_timestamp")
+    if expiry:
+        try:
+            return float(expiry)
+        except (TypeError, ValueError):
+            pass
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+        if claims.get("exp"):
+            return float(claims["exp"])
+    except jwt.PyJWTError:
+        pass
+    return time.time() + DEFAULT_TOKEN_LIFETIME
+
+
+class OneMapTokenManager:
+    """
+    Fetches the OneMap access token on first use and shares it across threads.
+    The token is refreshed in the background shortly before it expires.
+    """
+
+    def __init__(self):
+        self.token = ""
+        self.expires_at = 0.0
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self):
+        try:
+            email, password = _read_credentials()
+            response = requests.post(url, json={"email": email, "password": password}, timeout=REQUEST_TIMEOUT)
+            data = json.loads(response.text)
+            token = data["access_token"]
+        except Exception as e:
+            print(f"Failed to get OneMap token: {e}")
+            self._failed_at = time.time()
+            return
+        self.expires_at = _get_expiry(data, token)
+        self.token = token
+        print("OneMap token refreshed")
+
+    def _refresh_in_background(self):
+        try:
+            with self._lock:
+                self._fetch()
+        finally:
+            self._refreshing = False
+
+    def cached_token(self):
+        """
+        Return the current token if it is still valid, without any network call.
+        A token that expires within REFRESH_MARGIN is refreshed in the background.
+        """
+        now = time.time()
+        if self.token and now < self.expires_at:
+            if self.expires_at - now < REFRESH_MARGIN and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+            return self.token
+        return None
+
+    def get_token(self):
+        """
+        Return a valid token, fetching it first if there is none. "" if it can not be fetched.
+        """
+        token = self.cached_token()
+        if token:
+            return token
+
+        with self._lock:
+            token = self.cached_token()
+            if token:
+                return token
+            if time.time() - self._failed_at >= RETRY_INTERVAL:
+                self._fetch()
+            return self.cached_token() or ""
+
+    def invalidate(self):
+        """
+        Drop the token, e.g. after the API rejected it, so that the next call fetches a new one.
+        """
+        self.expires_at = 0.0
+        self._failed_at = 0.0
+
 
-    payload = {
-        "email": email,
-        "password": password
-    }
-    print(payload)
+token_manager = OneMapTokenManager()
 
-    response = requests.request("POST", url, json=payload)
-    print(response.text)
-    AUTH = json.loads(response.text)["access_token"]
-except Exception as e:
-    print(e)
-    AUTH = ""
-print(AUTH)
 
+def get_auth():
+    return token_manager.get_token()
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import httpx
+
+from agent.utils.get_config import config_data
+from .get_onemap_auth import token_manager
+
+onemap_config = config_data.get("onemap") or {}
+ONEMAP_BASE_URL = onemap_config.get("base_url", "https://www.onemap.gov.sg")
+ONEMAP_TIMEOUT = onemap_config.get("timeout", 10)  # seconds per request
+ONEMAP_MAX_CONCURRENCY = onemap_config.get("max_concurrency", 8)
+ONEMAP_RETRIES = onemap_config.get("retries", 2)
+ONEMAP_BACKOFF = onemap_config.get("backoff", 0.5)  # seconds, doubled after each retry
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class OneMapClient:
+    """
+    Async OneMap client with a keep-alive connection pool.
+    The client lives on its own event loop thread so that synchronous tools can share it,
+    get() and get_many() block until the requests finish.
+    """
+
+    def __init__(self, base_url=ONEMAP_BASE_URL, timeout=ONEMAP_TIMEOUT, max_concurrency=ONEMAP_MAX_CONCURRENCY,
+                 retries=ONEMAP_RETRIES, backoff=ONEMAP_BACKOFF):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+
+    def _start(self):
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="onemap-client", daemon=True).start()
+
+            async def init():
+                self._client = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=self.max_concurrency,
+                                        max_keepalive_connections=self.max_concurrency),
+                )
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            asyncio.run_coroutine_threadsafe(init(), loop).result()
+            self._loop = loop
+            return loop
+
+    async def fetch(self, url):
+        """
+        GET a OneMap relative url and return the JSON result, None on a non-200 response.
+        Connection errors, timeouts, 429 and 5xx responses are retried with exponential backoff,
+        a 401 response is retried once with a new token.
+        """
+        delay = self.backoff
+        token_refreshed = False
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    # cached_token() also starts the background refresh of a token about to expire
+                    token = token_manager.cached_token() or await asyncio.to_thread(token_manager.get_token)
+                    response = await self._client.get(url, headers={"Authorization": token})
+                    if response.status_code == 401 and not token_refreshed:
+                        # token expired or revoked, fetch a new one and retry immediately
+                        token_refreshed = True
+                        token_manager.invalidate()
+                        continue
+                    if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                        break
+                    print(f"OneMap request returned {response.status_code}, retrying: {url}")
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    if attempt == self.retries:
+                        raise e
+                    print(f"OneMap request failed, retrying: {url}: {e}")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        if response.status_code == 200:
+            return response.json()
+        print(f"Failed to retrieve data: {response.status_code}")
+        return None
+
+    def get(self, url):
+        loop = self._start()
+        return asyncio.run_coroutine_threadsafe(self.fetch(url), loop).result()
+
+    def get_many(self, urls):
+        """
+        Fetch the urls concurrently, return the results in the same order.
+        A request that raised has its exception in place of the result.
+        """
+        loop = self._start()
+
+        async def gather():
+            return await asyncio.gather(*(self.fetch(url) for url in urls), return_exceptions=True)
+
+        return asyncio.run_coroutine_threadsafe(gather(), loop).result()
+
+
+onemap_client = OneMapClient()
@@ -0,0 +1,56 @@
+from agent.utils.get_config import config_data
+from agent.utils.sqlite_cache import SqliteCache
+from .onemap_client import onemap_client
+
+cache_config = config_data.get("route_cache") or {}
+ROUTE_CACHE_ENABLED = cache_config.get("enabled", True)
+# decimals kept from the coordinates in the key, 5 decimals is about 1m
+ROUTE_KEY_PRECISION = cache_config.get("precision", 5)
+
+route_cache = SqliteCache(cache_config.get("path", "./cache/route_cache.sqlite3"),
+                          table="route_cache",
+                          ttl=cache_config.get("ttl", 2592000),
+                          max_entries=cache_config.get("max_entries", 20000))
+
+
+def get_route_cache_key(start, end, route_type):
+    def fmt(point):
+        return ",".join(f"{float(v):.{ROUTE_KEY_PRECISION}f}" for v in point)
+
+    return f"{route_type}:{fmt(start)}:{fmt(end)}"
+
+
+def get_route_url(start, end, route_type):
+    return f"/api/public/routingsvc/route?start={start[0]},{start[1]}&end={end[0]},{end[1]}&routeType={route_type}"
+
+
+def get_routes(start, ends, route_type="walk"):
+    """
+    Get the OneMap routes from start to each of ends ((lat, lng) tuples), in the same order.
+    Cached routes are served from the route cache, the others are requested concurrently.
+    A request that raised has its exception in place of the result.
+    """
+    results = [None] * len(ends)
+    missing = []
+    for i, end in enumerate(ends):
+        route = route_cache.get(get_route_cache_key(start, end, route_type)) if ROUTE_CACHE_ENABLED else None
+        if route is not None:
+            results[i] = route
+        else:
+            missing.append(i)
+
+    if missing:
+        fetched = onemap_client.get_many([get_route_url(start, ends[i], route_type) for i in missing])
+        for i, route in zip(missing, fetched):
+            results[i] = route
+            # only successful routes are cached
+            if ROUTE_CACHE_ENABLED and isinstance(route, dict) and route.get("status") == 0:
+                route_cache.set(get_route_cache_key(start, ends[i], route_type), route)
+    return results
+
+
+def get_route_cache_stats():
+    """
+    Counters of this process, including the runs of the sandbox workers, which send theirs with every result.
+    """
+    return route_cache.stats()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Model Deployment Script:
- - Loads the saved XGBoost model, target encoder, and town aggregated statistics.
+ - Loads the saved XGBoost model, target encoder, and town aggregated statistics once into a model registry.
  - Accepts an input (dictionary or DataFrame) that may contain a subset of the table columns.
  - Handles missing categorical values by filling them with "unknown".
  - Preprocesses the input (date conversion, time-based features, storey_range conversion, lease conversion).
@@ -13,6 +13,10 @@ Model Deployment Script:
  - Prints final features and processed input (all columns) and outputs the SHAP explanation.
 """
 
+import os
+import threading
+import time
+
 import pandas as pd
 import numpy as np
 import joblib
@@ -23,24 +27,123 @@ import shap
 # Configure pandas to display all columns when printing.
 pd.set_option('display.max_columns', None)
 
+MODEL_PATH = "./agent/tools/prediction/xgboost_house_price_model.joblib"
+ENCODER_PATH = "./agent/tools/prediction/target_encoder.joblib"
+TOWN_STATS_PATH = "./agent/tools/prediction/town_stats.joblib"
 
-def load_artifacts():
+
+def _load_artifacts_from_disk():
     """
     Load and return the saved XGBoost model, target encoder, and town aggregated statistics.
     Assumes files "xgboost_house_price_model.joblib", "target_encoder.joblib", and optionally "town_stats.joblib" exist.
     """
     # model = joblib.load("xgboost_house_price_model.joblib")
     # encoder = joblib.load("target_encoder.joblib")
-    model = joblib.load("./agent/tools/prediction/xgboost_house_price_model.joblib")
-    encoder = joblib.load("./agent/tools/prediction/target_encoder.joblib")
+    model = joblib.load(MODEL_PATH)
+    encoder = joblib.load(ENCODER_PATH)
     try:
         # town_stats = joblib.load("town_stats.joblib")
-        town_stats = joblib.load("./agent/tools/prediction/town_stats.joblib")
+        town_stats = joblib.load(TOWN_STATS_PATH)
     except Exception:
         town_stats = {}
     return model, encoder, town_stats
 
 
+class ModelRegistry:
+    """
+    Process-wide registry of the deployed model artifacts.
+    The artifacts are loaded once and swapped atomically when the files on disk change,
+    which is checked at most every check_interval seconds.
+    """
+
+    def __init__(self, paths, check_interval=30):
+        self.paths = paths
+        self.check_interval = check_interval
+        self.version = 0
+        self.loaded_at = None
+        self._artifacts = None
+        self._mtimes = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _get_mtimes(self):
+        mtimes = []
+        for path in self.paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _load(self, mtimes):
+        start = time.time()
+        model, encoder, town_stats = _load_artifacts_from_disk()
+        artifacts = (model, encoder, build_town_stats_frame(town_stats))
+        # 先完整加载，再一次性替换引用
+        self._artifacts = artifacts
+        self._mtimes = mtimes
+        self.version += 1
+        self.loaded_at = time.time()
+        print(f"Model artifacts v{self.version} loaded in {self.loaded_at - start:.2f}s")
+
+    def get(self):
+        """
+        Return (model, encoder, town_stats), reloading them first if the files changed.
+        town_stats is the DataFrame built by build_town_stats_frame.
+        """
+        artifacts = self._artifacts
+        if artifacts is not None and time.time() - self._checked_at < self.check_interval:
+            return artifacts
+        with self._lock:
+            now = time.time()
+            if self._artifacts is not None and now - self._checked_at < self.check_interval:
+                return self._artifacts
+            mtimes = self._get_mtimes()
+            self._checked_at = now
+            if self._artifacts is None:
+                self._load(mtimes)
+            elif mtimes != self._mtimes:
+                try:
+                    self._load(mtimes)
+                except Exception as e:
+                    # keep serving the old artifacts if the new files are incomplete
+                    print(f"Error reloading model artifacts: {e}")
+            return self._artifacts
+
+    def reload(self):
+        with self._lock:
+            self._load(self._get_mtimes())
+            self._checked_at = time.time()
+            return self._artifacts
+
+    def info(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "files": dict(zip(self.paths, self._mtimes or ())),
+        }
+
+
+model_registry = ModelRegistry([MODEL_PATH, ENCODER_PATH, TOWN_STATS_PATH])
+
+
+def get_model_info():
+    """
+    Info of the deployed artifacts, loading them first if needed.
+    With the sandbox the predictions run in the worker processes, which load the same files,
+    so the API process loads them only to report on them.
+    """
+    model_registry.get()
+    return model_registry.info()
+
+
+def load_artifacts():
+    """
+    Return the saved XGBoost model, target encoder, and town aggregated statistics from the model registry.
+    """
+    return model_registry.get()
+
+
 def convert_storey_range(s):
     """
     Convert a storey_range string (e.g., "04 to 06") to a numeric value (midpoint).
@@ -65,6 +168,29 @@ def convert_remaining_lease(s):
         return np.nan
 
 
+def convert_storey_range_series(series):
+    """
+    Vectorized convert_storey_range over a Series. Values that are not "<lower> to <upper>" strings become NaN.
+    """
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return pd.Series(np.nan, index=series.index)
+    parts = series.str.extract(r"^\s*([+-]?[0-9]+)\s* to \s*([+-]?[0-9]+)\s*$")
+    return (pd.to_numeric(parts[0]) + pd.to_numeric(parts[1])) / 2
+
+
+def convert_remaining_lease_series(series):
+    """
+    Vectorized convert_remaining_lease over a Series. Strings are converted to years
+    (NaN if they can not be parsed), other values are kept as they are.
+    """
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return series
+    is_str = series.map(lambda x: isinstance(x, str)).astype(bool)
+    parts = series.str.extract(r"^\s*([+-]?[0-9]+)\s+\S+\s+([+-]?[0-9]+)(?:\s[\s\S]*)?$")
+    years = pd.to_numeric(parts[0]) + pd.to_numeric(parts[1]) / 12.0
+    return years.where(is_str, series).infer_objects()
+
+
 def preprocess_input(df):
     """
     Preprocess the input DataFrame:
@@ -100,50 +226,53 @@ def preprocess_input(df):
 
     # Create time-based features.
     df['year'] = df['month'].dt.year
-    df['month_num'] = df['month'].dt.month
-    df['month_sin'] = df['month_num'].apply(lambda m: np.sin(2 * np.pi * m / 12) if pd.notnull(m) else np.nan)
-    df['month_cos'] = df['month_num'].apply(lambda m: np.cos(2 * np.pi * m / 12) if pd.notnull(m) else np.nan)
-    df.drop(columns=['month_num'], inplace=True)
+    month_num = df['month'].dt.month.astype(float)
+    df['month_sin'] = np.sin(2 * np.pi * month_num / 12)
+    df['month_cos'] = np.cos(2 * np.pi * month_num / 12)
 
     # Convert 'storey_range' to numeric.
-    df['storey_range_numeric'] = df['storey_range'].apply(
-        lambda x: convert_storey_range(x) if pd.notnull(x) else np.nan)
+    df['storey_range_numeric'] = convert_storey_range_series(df['storey_range'])
 
     # Convert lease_commence_date to numeric.
     df['lease_commence_date'] = pd.to_numeric(df['lease_commence_date'], errors='coerce')
 
     # Convert remaining_lease from string to numeric (years).
-    df['remaining_lease'] = df['remaining_lease'].apply(
-        lambda x: convert_remaining_lease(x) if isinstance(x, str) else x)
+    df['remaining_lease'] = convert_remaining_lease_series(df['remaining_lease'])
 
     return df
 
 
+TOWN_STAT_COLUMNS = ['town_mean', 'town_median', 'town_std', 'town_count']
+
+
+def build_town_stats_frame(town_stats):
+    """
+    Build a DataFrame indexed by town from the dictionary of town aggregated statistics,
+    with the columns 'town_mean', 'town_median', 'town_std', 'town_count'.
+    """
+    if isinstance(town_stats, pd.DataFrame):
+        return town_stats
+    rows = {
+        town: [stats.get(col, np.nan) for col in TOWN_STAT_COLUMNS]
+        for town, stats in (town_stats or {}).items()
+        if isinstance(town, str) and stats is not None
+    }
+    return pd.DataFrame.from_dict(rows, orient='index', columns=TOWN_STAT_COLUMNS).astype(float)
+
+
 def fill_town_aggregates(df, town_stats):
     """
-    Given a DataFrame df and a dictionary of town aggregated statistics (town_stats),
-    fill in the extended town features: 'town_mean', 'town_median', 'town_std', 'town_count'.
+    Given a DataFrame df and the town aggregated statistics (town_stats, a dictionary or
+    a DataFrame from build_town_stats_frame), fill in the extended town features:
+    'town_mean', 'town_median', 'town_std', 'town_count'.
     """
+    town_stats_df = build_town_stats_frame(town_stats)
 
-    def get_stats(town):
-        # Convert town to uppercase for lookup.
-        key = str(town).upper()
-        stats = town_stats.get(key, None)
-        if stats is None:
-            return pd.Series([np.nan, np.nan, np.nan, np.nan],
-                             index=['town_mean', 'town_median', 'town_std', 'town_count'])
-        else:
-            # Expect stats to be a dictionary with these keys.
-            return pd.Series([
-                stats.get("town_mean", np.nan),
-                stats.get("town_median", np.nan),
-                stats.get("town_std", np.nan),
-                stats.get("town_count", np.nan)
-            ], index=['town_mean', 'town_median', 'town_std', 'town_count'])
-
-    # For each row, fill in the extended town features.
+    # Look up every row at once, towns are matched in uppercase.
     if 'town' in df.columns:
-        stats_df = df['town'].apply(lambda x: get_stats(x if pd.notnull(x) else "unknown"))
+        keys = df['town'].where(df['town'].notna(), "unknown").astype(str).str.upper()
+        stats_df = town_stats_df.reindex(keys.values)
+        stats_df.index = df.index
         df = pd.concat([df, stats_df], axis=1)
     else:
         df['town_mean'] = np.nan
@@ -199,8 +328,8 @@ def predict_house_price(input_data):
     # Preprocess the input.
     processed_input = preprocess_input(df_input)
 
-    # Load town aggregated statistics if used
-    _, _, town_stats = load_artifacts()
+    # Load the saved model, target encoder and town aggregated statistics.
+    model, encoder, town_stats = load_artifacts()
 
     # Prepare the final features (this will fill extended town features if defined).
     X_input = prepare_features(processed_input, town_stats)
@@ -214,9 +343,6 @@ def predict_house_price(input_data):
     for col in categorical_cols:
         X_input.loc[:, col] = X_input[col].fillna("unknown")
 
-    # Load the saved model and target encoder.
-    model, encoder, _ = load_artifacts()
-
     # Apply the target encoder to the categorical columns. This expects the same dimensions as it was fit with.
     X_input.loc[:, categorical_cols] = encoder.transform(X_input[categorical_cols]).astype(float)
 
@@ -229,6 +355,26 @@ def predict_house_price(input_data):
     return predicted_price, X_input, processed_input
 
 
+def predict_house_price_batch(df_input):
+    """
+    Predict the house prices of many rows (e.g. months x property variants) in one pass.
+    Preprocessing, target encoding and model.predict run once over the whole DataFrame.
+
+    Returns:
+      A copy of df_input with a 'predicted_price' column added, in the same row order.
+    """
+    if not isinstance(df_input, pd.DataFrame):
+        raise ValueError("Input data must be a DataFrame.")
+    result = df_input.copy()
+    if result.empty:
+        result['predicted_price'] = pd.Series(dtype=float)
+        return result
+
+    predicted_price, _, _ = predict_house_price(df_input.reset_index(drop=True))
+    result['predicted_price'] = predicted_price
+    return result
+
+
 def compute_shap_explanation(model, X_input):
     """
     Compute SHAP values for the input X_input and return a DataFrame listing each feature's contribution.
@@ -0,0 +1,137 @@
+"""
+Local statistical forecast of HDB resale prices.
+
+Fits a damped-trend exponential smoothing model with additive monthly seasonality
+(Holt-Winters) on the monthly price series from get_llm_predict_hdb_info and returns
+the same 'month' / 'predicted_price' DataFrame as llm_predict_hdb_func, without a remote call.
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+SEASON_LENGTH = 12
+# only the most recent months are used to fit the model
+FIT_WINDOW = 120
+
+ALPHA_GRID = [0.2, 0.4, 0.6, 0.8]
+BETA_GRID = [0.02, 0.1, 0.3]
+PHI_GRID = [0.8, 0.9, 0.98]
+GAMMA_GRID = [0.05, 0.2]
+
+
+def history_to_monthly_series(hdb_price_history):
+    """
+    Convert the price history (monthly averages or raw transactions) to a monthly pd.Series
+    indexed by "YYYY-MM", with missing months linearly interpolated.
+    """
+    if not hdb_price_history:
+        return pd.Series(dtype=float)
+    df = pd.DataFrame(hdb_price_history)
+    price_col = 'avg_resale_price' if 'avg_resale_price' in df.columns else 'resale_price'
+    df = df[df['month'].notna() & df[price_col].notna()]
+    if df.empty:
+        return pd.Series(dtype=float)
+
+    if price_col == 'avg_resale_price' and 'original_count' in df.columns:
+        # 按成交量加权，与原始记录求平均的结果一致
+        df = df.assign(total=df[price_col].astype(float) * df['original_count'], count=df['original_count'])
+    else:
+        df = df.assign(total=df[price_col].astype(float), count=1)
+    df['month'] = pd.PeriodIndex(df['month'].astype(str).str[:7], freq='M')
+    grouped = df.groupby('month')[['total', 'count']].sum()
+    series = grouped['total'] / grouped['count']
+
+    full_index = pd.period_range(series.index.min(), series.index.max(), freq='M')
+    series = series.reindex(full_index).interpolate()
+    series.index = series.index.strftime('%Y-%m')
+    return series
+
+
+def _initial_state(y, seasonal):
+    m = SEASON_LENGTH
+    if seasonal:
+        level = y[:m].mean()
+        trend = (y[m:2 * m].mean() - level) / m
+        season = y[:m] - level
+    else:
+        level = y[0]
+        trend = y[1] - y[0] if len(y) > 1 else 0.0
+        season = np.zeros(m)
+    return level, trend, season
+
+
+def _smooth(y, alpha, beta, phi, gamma, seasonal):
+    """
+    Run the damped-trend smoothing over y, return (sse of one-step forecasts, level, trend, season).
+    """
+    m = SEASON_LENGTH
+    level, trend, season = _initial_state(y, seasonal)
+    season = season.copy()
+    sse = 0.0
+    for t in range(len(y)):
+        s = season[t % m]
+        err = y[t] - (level + phi * trend + s)
+        sse += err * err
+        new_level = alpha * (y[t] - s) + (1 - alpha) * (level + phi * trend)
+        trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        level = new_level
+        if seasonal:
+            season[t % m] = gamma * (y[t] - level) + (1 - gamma) * s
+    return sse, level, trend, season
+
+
+def forecast_damped_trend(y, horizon):
+    """
+    Fit the smoothing parameters on y by grid search over one-step errors and forecast horizon steps ahead.
+    """
+    y = np.asarray(y, dtype=float)[-FIT_WINDOW:]
+    n = len(y)
+    if n == 0:
+        raise ValueError("No price history to forecast from")
+    if n == 1:
+        return np.full(horizon, y[0])
+
+    seasonal = n >= 2 * SEASON_LENGTH
+    gamma_grid = GAMMA_GRID if seasonal else [0.0]
+    best = None
+    for alpha, beta, phi, gamma in itertools.product(ALPHA_GRID, BETA_GRID, PHI_GRID, gamma_grid):
+        sse, level, trend, season = _smooth(y, alpha, beta, phi, gamma, seasonal)
+        if best is None or sse < best[0]:
+            best = (sse, level, trend, season, phi)
+
+    _, level, trend, season, phi = best
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(phi ** steps) * trend
+    season_idx = (n + steps - 1) % SEASON_LENGTH
+    return level + damped + season[season_idx]
+
+
+def stat_predict_hdb_func(hdb_price_history, from_date: str, to_date: str) -> pd.DataFrame:
+    """
+    Forecast the monthly price from from_date to to_date ("YYYY-MM") with the damped-trend model.
+    Only the history before from_date is used. Raises ValueError if there is none.
+    """
+    first_month = pd.Period(from_date, freq='M')
+    series = history_to_monthly_series(hdb_price_history).dropna()
+    if series.empty:
+        # the empty series has no month index to compare with
+        raise ValueError("No price history")
+    series = series[series.index < first_month.strftime('%Y-%m')]
+    if series.empty:
+        raise ValueError("No price history before the prediction range")
+
+    last_month = pd.Period(series.index[-1], freq='M')
+    months = pd.period_range(first_month, pd.Period(to_date, freq='M'), freq='M')
+    horizon = (months[-1] - last_month).n
+    predicted = forecast_damped_trend(series.values, horizon)
+    # 预测从 last_month 的下一个月开始，取出请求的区间
+    offset = (months[0] - last_month).n - 1
+    predicted = np.maximum(predicted[offset:offset + len(months)], 0.0)
+
+    df = pd.DataFrame({
+        'month': months.strftime('%Y-%m'),
+        'predicted_price': np.round(predicted, 1),
+    })
+    return df
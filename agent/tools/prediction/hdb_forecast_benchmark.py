@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Backtest of the predict_hdb_price forecasting engines.
+
+For each search condition the last HOLDOUT months of history are held out, both the local
+damped-trend model and the LLM forecast them from the earlier history, and the MAPE against
+the actual monthly averages and the latency of each engine are printed.
+
+Run from the project root:
+    python -m agent.tools.prediction.hdb_forecast_benchmark          # local model only
+    python -m agent.tools.prediction.hdb_forecast_benchmark --llm    # also call the LLM
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from agent.utils.get_config import config_data
+from agent.tools.llm_analysis.llm_predict_hdb import get_llm_predict_hdb_info, llm_predict_hdb_func, \
+    sample_monthly_history
+from agent.tools.prediction.hdb_forecast import history_to_monthly_series, stat_predict_hdb_func
+
+HOLDOUT = 12
+
+CASES = [
+    {"plan_area": "ANG MO KIO", "flat_type": "3 ROOM"},
+    {"plan_area": "TAMPINES", "flat_type": "4 ROOM"},
+    {"plan_area": "BEDOK"},
+    {"plan_area": "PUNGGOL", "flat_type": "5 ROOM"},
+    {"flat_type": "EXECUTIVE"},
+]
+
+
+def mape(actual, predicted):
+    actual = np.asarray(actual, dtype=float)
+    predicted = np.asarray(predicted, dtype=float)
+    return float(np.mean(np.abs(predicted - actual) / actual) * 100)
+
+
+def run_case(engine, llm, filters):
+    search_conditions, hdb_price_history, _ = get_llm_predict_hdb_info(engine, **filters)
+    series = history_to_monthly_series(hdb_price_history)
+    if len(series) <= HOLDOUT + 1:
+        print(f"{filters}: not enough history ({len(series)} months), skipped")
+        return None
+
+    actual = series.iloc[-HOLDOUT:]
+    from_date, to_date = actual.index[0], actual.index[-1]
+    row = {"case": str(filters), "months": len(series)}
+
+    start = time.perf_counter()
+    stat_df = stat_predict_hdb_func(hdb_price_history, from_date, to_date)
+    row["stat_ms"] = (time.perf_counter() - start) * 1000
+    row["stat_mape"] = mape(actual.values, stat_df["predicted_price"].values)
+
+    if llm is not None:
+        train = [record for record in hdb_price_history if str(record["month"]) < from_date]
+        hdb_info = (search_conditions, train, sample_monthly_history(train))
+        start = time.perf_counter()
+        try:
+            llm_df = llm_predict_hdb_func(engine, llm, from_date=from_date, to_date=to_date, hdb_info=hdb_info)
+            llm_df = llm_df.set_index("month").reindex(actual.index)
+            row["llm_ms"] = (time.perf_counter() - start) * 1000
+            row["llm_mape"] = mape(actual.values, llm_df["predicted_price"].values)
+        except Exception as e:
+            print(f"{filters}: LLM forecast failed: {e}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="also backtest the LLM forecast")
+    args = parser.parse_args()
+
+    engine = sqlalchemy.create_engine(config_data['mysql'])
+    llm = None
+    if args.llm:
+        from agent.utils.llm_access.LLM import get_llm
+        llm = get_llm()
+
+    rows = []
+    for filters in CASES:
+        row = run_case(engine, llm, filters)
+        if row is not None:
+            rows.append(row)
+
+    result = pd.DataFrame(rows)
+    pd.set_option('display.width', 200)
+    print(result.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    if not result.empty:
+        print("\nMean:")
+        print(result.drop(columns=["case", "months"]).mean().to_string(float_format=lambda x: f"{x:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
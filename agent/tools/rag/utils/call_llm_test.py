@@ -1,7 +1,16 @@
 
 from utils.get_config import config_data
+from agent.utils.llm_access.llm_cache import get_cached_answer, set_cached_answer
+
+def call_llm(question, llm, cache=None):
+    """
+    cache: name of the call site, set it to reuse answers of identical prompts from the disk cache.
+    """
+    if cache:
+        cached_answer = get_cached_answer(cache, question, config_data["model_name"])
+        if cached_answer is not None:
+            return cached_answer
 
-def call_llm(question, llm):
     response = llm.chat.completions.create(
         model=config_data["model_name"],
         messages=[
@@ -11,4 +20,7 @@ def call_llm(question, llm):
         stream=False
     )
 
-    return response.choices[0].message
+    answer = response.choices[0].message
+    if cache:
+        set_cached_answer(question, config_data["model_name"], answer)
+    return answer
@@ -0,0 +1,111 @@
+import copy
+import functools
+import hashlib
+import inspect
+import threading
+
+import pandas as pd
+
+
+class ToolMemo:
+    """
+    Results of tool calls made while answering one question, shared across the retries of the generated code.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def update_from(self, other):
+        self.entries.update(other.entries)
+        self.hits = other.hits
+        self.misses = other.misses
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+_local = threading.local()
+
+
+def get_active_memo():
+    return getattr(_local, "memo", None)
+
+
+def set_active_memo(memo):
+    """
+    Set the memo used by tool calls in the current thread, return the previous one.
+    """
+    previous = get_active_memo()
+    _local.memo = memo
+    return previous
+
+
+def normalize_arg(value):
+    if isinstance(value, pd.DataFrame):
+        content_hash = hashlib.sha256(pd.util.hash_pandas_object(value, index=True).values.tobytes()).hexdigest()
+        return "DataFrame", tuple(str(c) for c in value.columns), content_hash
+    if isinstance(value, pd.Series):
+        return normalize_arg(value.to_frame())
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), normalize_arg(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(normalize_arg(v) for v in value)
+    return repr(value)
+
+
+def make_memo_key(func, args, kwargs):
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return func.__name__ + repr(tuple((name, normalize_arg(v)) for name, v in bound.arguments.items()))
+
+
+def memoize_tool(func):
+    """
+    Serve repeated calls with the same normalized arguments from the active ToolMemo.
+    Without an active memo the tool is called as usual. None results and exceptions are not memoized.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        memo = get_active_memo()
+        if memo is None:
+            return func(*args, **kwargs)
+        try:
+            key = make_memo_key(func, args, kwargs)
+        except Exception as e:
+            print(f"Tool memo key error for {func.__name__}: {e}")
+            return func(*args, **kwargs)
+        if key in memo.entries:
+            memo.hits += 1
+            print(f"Tool call served from memo: {func.__name__}")
+            return copy.deepcopy(memo.entries[key])
+        memo.misses += 1
+        result = func(*args, **kwargs)
+        if result is not None:
+            memo.entries[key] = copy.deepcopy(result)
+        return result
+
+    return wrapper
+
+
+def iterate_with_memo(gen, memo):
+    """
+    Iterate a generator with the memo active around each step, whichever thread drives it.
+    """
+    while True:
+        previous = set_active_memo(memo)
+        try:
+            item = next(gen)
+        except StopIteration:
+            return
+        finally:
+            set_active_memo(previous)
+        yield item
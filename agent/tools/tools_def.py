@@ -2,8 +2,10 @@ import pandas as pd
 import sqlalchemy
 
 from agent.utils.get_config import config_data
+from agent.utils.artifact_store import artifact_store
 from agent.utils.llm_access.LLM import get_llm
 from .copilot.data_explanation import get_llm_data_explanation_func
+from .tool_memo import memoize_tool
 
 DATABASE_URL = config_data['mysql']
 engine = sqlalchemy.create_engine(DATABASE_URL)
@@ -16,6 +18,7 @@ from .copilot.sql_code import query_database_func
 from .copilot.python_code import draw_graph_func
 
 
+@memoize_tool
 def query_database(question: str, df_cols: str | list = None) -> pd.DataFrame:
     """
     query_database(question: str, df_cols: str | list = None) -> pd.DataFrame:
@@ -46,6 +49,7 @@ def query_database(question: str, df_cols: str | list = None) -> pd.DataFrame:
     return result
 
 
+@memoize_tool
 def draw_graph(question: str, data: pd.DataFrame) -> str:
     """
     draw_graph(question: str, data: pd.DataFrame) -> str:
@@ -71,10 +75,12 @@ def draw_graph(question: str, data: pd.DataFrame) -> str:
     ```
     """
     result = draw_graph_func(question, data, llm)
-    result = STATIC_URL + result[2:]
+    artifact_store.register(result)
+    result = artifact_store.url(result)
     return result
 
 
+@memoize_tool
 def explain_data(question: str, data: pd.DataFrame) -> str:
     """
     explain_data(question: str, data: pd.DataFrame) -> str:
@@ -0,0 +1,244 @@
+import os
+import random
+import re
+import sqlite3
+import string
+import threading
+import time
+
+from agent.utils.get_config import config_data
+
+STATIC_URL = config_data['static_path']
+
+store_config = config_data.get("artifact_store") or {}
+# served by main.py under /tmp_imgs/
+ARTIFACT_ROOT = store_config.get("root", "./tmp_imgs")
+ARTIFACT_INDEX_PATH = store_config.get("index_path", "./cache/artifacts.sqlite3")
+ARTIFACT_MAX_BYTES = store_config.get("max_bytes", 2 * 1024 ** 3)
+ARTIFACT_MAX_AGE = store_config.get("max_age", 7 * 86400)  # seconds
+JANITOR_INTERVAL = store_config.get("janitor_interval", 600)  # seconds
+
+# "ab/abcdefgh.png" in a shard directory, or "abcdefgh.png" for the files written before the store
+ARTIFACT_NAME_PATTERN = re.compile(r"^(?:[0-9a-z]{2}/)?[0-9A-Za-z_-]+\.[0-9A-Za-z]+$")
+# files of the root directory that are not artifacts
+KEEP_FILES = {"imgs.txt"}
+SHARD_CHARS = 2
+
+
+def generate_random_string(length=8):
+    letters = string.ascii_lowercase
+    random_string = ''.join(random.choice(letters) for _ in range(length))
+    return random_string
+
+
+class ArtifactStore:
+    """
+    Generated files (charts, DataFrame pages) in shard directories under root, e.g. ./tmp_imgs/ab/abcdefgh.png.
+    An sqlite index keeps the size and last access of every file. The janitor thread deletes the files
+    older than max_age, then the least recently used ones until the total size is under max_bytes.
+    0 disables a limit.
+    """
+
+    def __init__(self, root=ARTIFACT_ROOT, index_path=ARTIFACT_INDEX_PATH, max_bytes=ARTIFACT_MAX_BYTES,
+                 max_age=ARTIFACT_MAX_AGE, janitor_interval=JANITOR_INTERVAL):
+        self.root = root
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.janitor_interval = janitor_interval
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._janitor = None
+        self._stop = threading.Event()
+
+    def _connect(self):
+        if self._conn is None:
+            dir_name = os.path.dirname(self.index_path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            # the sandbox workers register their files in the same index
+            conn = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_last_access ON artifacts (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def new_path(self, ext, key=None):
+        """
+        Path for a new artifact, e.g. new_path(".png") -> "./tmp_imgs/ab/abcdefghijkl.png".
+        key names the file, a random name is used if it is None.
+        """
+        key = key or generate_random_string(12)
+        name = f"{key[:SHARD_CHARS]}/{key}{ext}"
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def path(self, name):
+        return self.root + "/" + name
+
+    def name_of(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def url(self, path):
+        return STATIC_URL + os.path.basename(os.path.normpath(self.root)) + "/" + self.name_of(path)
+
+    def register(self, path):
+        """
+        Record a file written by a producer, so that it counts against the budget right away.
+        Registering a file again, e.g. a content-addressed file saved again, restarts its max_age.
+        Files that are not registered are picked up by the next janitor run.
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Artifact not registered: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("""
+                    INSERT INTO artifacts (name, size, created_at, last_access) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET size = excluded.size, created_at = excluded.created_at,
+                        last_access = excluded.last_access
+                """, (self.name_of(path), size, now, now))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Artifact index write error: {e}")
+
+    def open(self, name):
+        """
+        Return the path of the artifact name and mark it as used, None if the name is invalid or the file is gone.
+        """
+        if not ARTIFACT_NAME_PATTERN.match(name):
+            return None
+        path = self.path(name)
+        if not os.path.isfile(path):
+            return None
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("UPDATE artifacts SET last_access = ? WHERE name = ?", (time.time(), name))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Artifact index write error: {e}")
+        return path
+
+    def _scan(self):
+        files = {}
+        for dir_path, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if file_name in KEEP_FILES or file_name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[self.name_of(path)] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def sync(self):
+        """
+        Add the files missing from the index, e.g. written by generated code, and drop the rows of deleted files.
+        """
+        files = self._scan()
+        with self._lock:
+            conn = self._connect()
+            indexed = {name for name, in conn.execute("SELECT name FROM artifacts")}
+            conn.executemany("INSERT OR IGNORE INTO artifacts (name, size, created_at, last_access) VALUES (?, ?, ?, ?)",
+                             [(name, size, mtime, mtime) for name, (size, mtime) in files.items()
+                              if name not in indexed])
+            conn.executemany("DELETE FROM artifacts WHERE name = ?", [(name,) for name in indexed - files.keys()])
+            conn.commit()
+
+    def _delete(self, conn, names):
+        deleted_bytes = 0
+        for name, size in names:
+            try:
+                os.remove(self.path(name))
+                deleted_bytes += size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Artifact not deleted: {e}")
+                continue
+            conn.execute("DELETE FROM artifacts WHERE name = ?", (name,))
+        conn.commit()
+        self.evicted += len(names)
+        self.evicted_bytes += deleted_bytes
+        return deleted_bytes
+
+    def evict(self):
+        """
+        Delete the artifacts older than max_age, then the least recently used until the total is under max_bytes.
+        """
+        with self._lock:
+            conn = self._connect()
+            if self.max_age:
+                expired = conn.execute("SELECT name, size FROM artifacts WHERE created_at < ?",
+                                       (time.time() - self.max_age,)).fetchall()
+                self._delete(conn, expired)
+            if self.max_bytes:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+                if total > self.max_bytes:
+                    victims = []
+                    for name, size in conn.execute("SELECT name, size FROM artifacts ORDER BY last_access"):
+                        if total <= self.max_bytes:
+                            break
+                        victims.append((name, size))
+                        total -= size
+                    self._delete(conn, victims)
+
+    def run_janitor_once(self):
+        try:
+            self.sync()
+            self.evict()
+        except sqlite3.Error as e:
+            print(f"Artifact janitor error: {e}")
+
+    def _janitor_loop(self):
+        while not self._stop.is_set():
+            self.run_janitor_once()
+            self._stop.wait(self.janitor_interval)
+
+    def start_janitor(self):
+        if self._janitor is None and self.janitor_interval:
+            self._stop.clear()
+            self._janitor = threading.Thread(target=self._janitor_loop, name="artifact-janitor", daemon=True)
+            self._janitor.start()
+
+    def stop_janitor(self):
+        self._stop.set()
+        self._janitor = None
+
+    def stats(self):
+        with self._lock:
+            try:
+                count, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+            except sqlite3.Error as e:
+                print(f"Artifact index read error: {e}")
+                count, total = None, None
+        return {
+            "files": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark of df_to_markdown against the previous iterrows renderer.
+
+Run from the project root:
+    python -m agent.utils.df_to_markdown_benchmark
+    python -m agent.utils.df_to_markdown_benchmark --rows 10000 --cols 20 --repeat 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from agent.utils.final_output_parse import df_to_markdown
+
+
+def df_to_markdown_iterrows(df, bold_header=False):
+    # the renderer before the column-wise version, kept as the reference output
+    header = df.columns.tolist()
+    if bold_header:
+        header = ["**{}**".format(col) for col in header]
+    markdown_str = " | ".join(header) + " \n"
+    markdown_str += " | ".join(['---' for _ in header]) + " \n"
+    for index, row in df.iterrows():
+        escaped_row = [str(cell).replace("\n", "<br>").replace("|", "\\|") for cell in row]
+        markdown_str += " | ".join(escaped_row) + " \n"
+    return "\n"+markdown_str+"\n"
+
+
+def make_frame(rows, cols, mixed=True, seed=0):
+    """
+    rows x cols frame, mixed=True cycles int, float, text (with pipes and newlines) and date columns.
+    mixed=False has only float columns.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 4 if mixed else 1
+        if kind == 0:
+            data[f"int_{i}"] = rng.integers(0, 1000000, rows)
+        elif kind == 1:
+            data[f"float_{i}"] = rng.normal(500000, 100000, rows).round(2)
+        elif kind == 2:
+            words = np.array(["ANG MO KIO", "BEDOK", "4 ROOM", "a|b", "line\nbreak", ""])
+            data[f"text_{i}"] = words[rng.integers(0, len(words), rows)]
+        else:
+            data[f"date_{i}"] = pd.Timestamp("2017-01-01") + pd.to_timedelta(rng.integers(0, 3000, rows), unit="D")
+    return pd.DataFrame(data)
+
+
+def timeit(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(rows, cols, repeat):
+    for name, df in [("mixed", make_frame(rows, cols)), ("float", make_frame(rows, cols, mixed=False))]:
+        old_time, old = timeit(lambda: df_to_markdown_iterrows(df), repeat)
+        new_time, new = timeit(lambda: df_to_markdown(df, max_rows=0, max_bytes=0), repeat)
+        capped_time, capped = timeit(lambda: df_to_markdown(df), repeat)
+        print(f"{name} {rows}x{cols}: iterrows {old_time * 1000:.1f}ms, "
+              f"column-wise {new_time * 1000:.1f}ms ({old_time / new_time:.1f}x), "
+              f"capped {capped_time * 1000:.1f}ms ({len(capped)} chars), same output: {old == new}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args()
+    run(args.rows, args.cols, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
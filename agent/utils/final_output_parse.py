@@ -1,5 +1,12 @@
 import re
 
+from agent.utils.get_config import config_data
+
+table_config = config_data.get("markdown_table") or {}
+# limits of df_to_markdown for huge frames, 0 for no limit
+MARKDOWN_MAX_ROWS = table_config.get("max_rows", 1000)
+MARKDOWN_MAX_BYTES = table_config.get("max_bytes", 200000)
+
 
 def is_url(s):
     # 简单的URL正则表达式
@@ -48,20 +55,50 @@ def is_iframe_tag(s):
 
 
 
-def df_to_markdown(df, bold_header=False):
+def _column_to_str(col):
+    # same text as str(cell), datetime-like columns would be formatted differently by astype(str)
+    if col.dtype.kind in "biufcO":
+        return col.astype(str)
+    return col.map(str)
+
+
+def df_to_markdown(df, bold_header=False, max_rows=MARKDOWN_MAX_ROWS, max_bytes=MARKDOWN_MAX_BYTES):
+    """
+    Render df as a markdown table, the cells are converted and escaped column by column.
+    Only the first max_rows rows are rendered, and the rows past max_bytes characters of output are dropped,
+    a note with the number of rows left out is added. 0 or None for no limit.
+    """
     # Start with the header
     header = df.columns.tolist()
     if bold_header:
         header = ["**{}**".format(col) for col in header]
-    markdown_str = " | ".join(header) + " \n"
-
-    # Add separator
-    markdown_str += " | ".join(['---' for _ in header]) + " \n"
-
-    # Add rows
-    for index, row in df.iterrows():
-        # Escape pipe characters in the cells
-        escaped_row = [str(cell).replace("\n", "<br>").replace("|", "\\|") for cell in row]
-        markdown_str += " | ".join(escaped_row) + " \n"
-
+    lines = [" | ".join(header), " | ".join(['---' for _ in header])]
+
+    total_rows = len(df)
+    if max_rows and total_rows > max_rows:
+        df = df.iloc[:max_rows]
+
+    # iterrows gives the cells of a row in the common dtype of the columns, e.g. int as float next to a float column
+    row_dtype = df.iloc[:0].values.dtype
+    if row_dtype != object and df.dtypes.nunique() > 1:
+        df = df.astype(row_dtype)
+
+    # Escape pipe characters in the cells
+    columns = [_column_to_str(df.iloc[:, i]).str.replace("\n", "<br>", regex=False)
+               .str.replace("|", "\\|", regex=False).tolist()
+               for i in range(df.shape[1])]
+    rows = [" | ".join(cells) for cells in zip(*columns)] if columns else [""] * len(df)
+
+    if max_bytes:
+        size = sum(len(line) + 2 for line in lines)
+        for i, row in enumerate(rows):
+            size += len(row) + 2
+            if size > max_bytes:
+                rows = rows[:i]
+                break
+    lines.extend(rows)
+
+    markdown_str = " \n".join(lines) + " \n"
+    if len(rows) < total_rows:
+        markdown_str += "\n... {} more rows not shown\n".format(total_rows - len(rows))
     return "\n"+markdown_str+"\n"
@@ -0,0 +1,53 @@
+import hashlib
+import re
+
+from openai.types.chat import ChatCompletionMessage
+
+from utils.get_config import config_data
+from agent.utils.sqlite_cache import SqliteCache, HitCounters
+
+cache_config = config_data.get("llm_cache") or {}
+
+llm_cache = SqliteCache(cache_config.get("path", "./cache/llm_cache.sqlite3"),
+                        table="llm_cache",
+                        ttl=cache_config.get("ttl", 604800),
+                        max_entries=cache_config.get("max_entries", 5000))
+
+# hit / miss counters per call site, including the calls made in the sandbox workers
+call_site_stats = HitCounters("llm_call_sites")
+
+
+def normalize_prompt(prompt: str):
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def get_cache_key(prompt: str, model_name: str):
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return model_name + ":" + prompt_hash
+
+
+def get_cached_answer(call_site: str, prompt: str, model_name: str):
+    """
+    Return the cached answer as a ChatCompletionMessage, or None on miss.
+    """
+    if not cache_config.get("enabled", True):
+        return None
+    content = llm_cache.get(get_cache_key(prompt, model_name))
+    call_site_stats.count(call_site, content is not None)
+    if content is None:
+        return None
+    return ChatCompletionMessage(role="assistant", content=content)
+
+
+def set_cached_answer(prompt: str, model_name: str, answer):
+    if not cache_config.get("enabled", True) or not answer.content:
+        return
+    llm_cache.set(get_cache_key(prompt, model_name), answer.content)
+
+
+def drop_cached_answer(prompt: str, model_name: str):
+    llm_cache.delete(get_cache_key(prompt, model_name))
+
+
+def get_llm_cache_stats():
+    return {"total": llm_cache.stats(), "call_sites": call_site_stats.stats()}
@@ -1,15 +1,24 @@
-import random
-import string
+import hashlib
+import io
+import os
+import re
+import threading
 
 import pandas as pd
 import pygwalker as pyg
 from agent.utils.get_config import config_data
+from agent.utils.artifact_store import artifact_store
 STATIC_URL = config_data['static_path']
 
-def generate_random_string(length=8):
-    letters = string.ascii_lowercase
-    random_string = ''.join(random.choice(letters) for _ in range(length))
-    return random_string
+walker_config = config_data.get("walker") or {}
+# DataFrames are stored in the artifact store as <key>.parquet, the rendered pages as <key>.html next to them
+WALKER_URL_PATH = "walker/"
+PARQUET_COMPRESSION = walker_config.get("compression", "zstd")
+
+WALKER_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+_render_locks = {}
+_render_locks_lock = threading.Lock()
 
 
 def get_html(df: pd.DataFrame):
@@ -21,9 +30,89 @@ def get_html(df: pd.DataFrame):
     return html_str
 
 
+def _to_parquet_bytes(df: pd.DataFrame):
+    buffer = io.BytesIO()
+    try:
+        df.to_parquet(buffer, compression=PARQUET_COMPRESSION)
+    except Exception:
+        # parquet needs str column names and one type per column, e.g. not int and str mixed in an object column
+        df = df.copy()
+        df.columns = [str(col) for col in df.columns]
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].astype(str)
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, compression=PARQUET_COMPRESSION)
+    return buffer.getvalue()
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def get_walker_names(key):
+    shard = key[:2]
+    return f"{shard}/{key}.parquet", f"{shard}/{key}.html"
+
+
+def save_walker_data(df: pd.DataFrame):
+    """
+    Store df as compressed parquet under the hash of its content and return the key.
+    Identical DataFrames share the same file.
+    """
+    data = _to_parquet_bytes(df)
+    key = hashlib.sha256(data).hexdigest()[:32]
+    parquet_path = artifact_store.new_path(".parquet", key=key)
+    if not os.path.isfile(parquet_path):
+        _write_atomic(parquet_path, data)
+    artifact_store.register(parquet_path)
+    return key
+
+
 def pd_to_walker(df: pd.DataFrame):
-    file_path = "./tmp_imgs/" + generate_random_string(12)+".html"
-    html = get_html(df)
-    with open(file_path, 'w') as file:
-        file.write(html)
-    return STATIC_URL + file_path[2:]
+    """
+    Save df and return the url of its pygwalker page, the page is only built when the url is opened.
+    """
+    return STATIC_URL + WALKER_URL_PATH + save_walker_data(df) + ".html"
+
+
+def get_walker_html(key):
+    """
+    Return the pygwalker page of a stored DataFrame, building and caching it on the first request.
+    None if the key is unknown.
+    """
+    if not WALKER_KEY_PATTERN.match(key):
+        return None
+    parquet_name, html_name = get_walker_names(key)
+    html_path = artifact_store.open(html_name)
+    if html_path:
+        with open(html_path, 'r', encoding='utf-8') as file:
+            return file.read()
+    parquet_path = artifact_store.open(parquet_name)
+    if not parquet_path:
+        return None
+    html_path = artifact_store.path(html_name)
+
+    with _render_locks_lock:
+        lock = _render_locks.setdefault(key, threading.Lock())
+    # 同一页面的并发请求只生成一次
+    with lock:
+        try:
+            if os.path.isfile(html_path):
+                with open(html_path, 'r', encoding='utf-8') as file:
+                    return file.read()
+            try:
+                df = pd.read_parquet(parquet_path)
+            except FileNotFoundError:
+                # evicted in the meantime
+                return None
+            html = get_html(df)
+            if html:
+                _write_atomic(html_path, html.encode('utf-8'))
+                artifact_store.register(html_path)
+            return html
+        finally:
+            with _render_locks_lock:
+                _render_locks.pop(key, None)
@@ -0,0 +1,203 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# every cache of this process by (path, table), to carry the counters of the sandbox workers to the API process
+_caches = {}
+# every HitCounters of this process by name, reported the same way
+_counters = {}
+
+
+class SqliteCache:
+    """
+    A small disk-backed key/value cache on top of sqlite3.
+    Values are JSON strings, entries expire after ttl seconds and
+    the least recently used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, path, table="cache", ttl=86400, max_entries=10000, evict_every=100):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._reported_hits = 0
+        self._reported_misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        _caches[(path, table)] = self
+
+    def _connect(self):
+        if self._conn is None:
+            dir_name = os.path.dirname(self.path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access ON {self.table} (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is None or (self.ttl and now - row[1] > self.ttl):
+                    self.misses += 1
+                    return None
+                conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            except sqlite3.Error as e:
+                print(f"Cache read error: {e}")
+                self.misses += 1
+                return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_access)
+                    VALUES (?, ?, ?, ?)
+                """, (key, json.dumps(value, ensure_ascii=False), now, now))
+                conn.commit()
+                self._writes += 1
+                if self._writes % self.evict_every == 0:
+                    self._evict(conn, now)
+            except sqlite3.Error as e:
+                print(f"Cache write error: {e}")
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Cache delete error: {e}")
+
+    def _evict(self, conn, now):
+        if self.ttl:
+            conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,))
+        if self.max_entries:
+            conn.execute(f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class HitCounters:
+    """
+    Thread-safe hit / miss counters per key, e.g. per LLM call site.
+    Reported by the sandbox workers to the API process like the cache counters.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+        self._reported = {}
+        self._lock = threading.Lock()
+        _counters[name] = self
+
+    def count(self, key, hit):
+        with self._lock:
+            stats = self.counts.setdefault(key, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {key: dict(stats) for key, stats in self.counts.items()}
+
+    def take_deltas(self):
+        deltas = {}
+        with self._lock:
+            for key, stats in self.counts.items():
+                reported = self._reported.setdefault(key, {"hits": 0, "misses": 0})
+                hits = stats["hits"] - reported["hits"]
+                misses = stats["misses"] - reported["misses"]
+                if hits or misses:
+                    deltas[key] = (hits, misses)
+                reported.update(stats)
+        return deltas
+
+    def add_deltas(self, deltas):
+        with self._lock:
+            for key, (hits, misses) in deltas.items():
+                for counts in (self.counts, self._reported):
+                    stats = counts.setdefault(key, {"hits": 0, "misses": 0})
+                    stats["hits"] += hits
+                    stats["misses"] += misses
+
+
+def take_stats_deltas():
+    """
+    Hits and misses of each cache and HitCounters since the last call:
+    {"caches": {(path, table): (hits, misses)}, "counters": {name: {key: (hits, misses)}}}.
+    Sent by the sandbox workers with every finished run.
+    """
+    cache_deltas = {}
+    for key, cache in _caches.items():
+        with cache._lock:
+            hits = cache.hits - cache._reported_hits
+            misses = cache.misses - cache._reported_misses
+            cache._reported_hits = cache.hits
+            cache._reported_misses = cache.misses
+        if hits or misses:
+            cache_deltas[key] = (hits, misses)
+    counter_deltas = {}
+    for name, counters in _counters.items():
+        deltas = counters.take_deltas()
+        if deltas:
+            counter_deltas[name] = deltas
+    return {"caches": cache_deltas, "counters": counter_deltas}
+
+
+def add_stats_deltas(deltas):
+    """
+    Add the counters of a sandbox worker to the caches and HitCounters of this process.
+    """
+    deltas = deltas or {}
+    for key, (hits, misses) in deltas.get("caches", {}).items():
+        cache = _caches.get(key)
+        if cache is None:
+            continue
+        with cache._lock:
+            cache.hits += hits
+            cache.misses += misses
+            # counted in the worker, not to be reported again if this process is a worker too
+            cache._reported_hits += hits
+            cache._reported_misses += misses
+    for name, counter_deltas in deltas.get("counters", {}).items():
+        counters = _counters.get(name)
+        if counters is not None:
+            counters.add_deltas(counter_deltas)
@@ -0,0 +1,22 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ApiGroup, ApiInfo
+
+# the agent reloads its in-memory api catalog when this file changes
+CATALOG_VERSION_FILE = settings.BASE_DIR / "api_info_version"
+
+
+def bump_catalog_version():
+    CATALOG_VERSION_FILE.write_text(str(time.time_ns()))
+
+
+@receiver([post_save, post_delete], sender=ApiInfo)
+@receiver([post_save, post_delete], sender=ApiGroup)
+def api_catalog_changed(sender, **kwargs):
+    # after the commit, so that the agent never reloads the old rows
+    transaction.on_commit(bump_catalog_version)
@@ -1,10 +1,11 @@
+import json
 import mimetypes
 
 import sqlalchemy
 import uvicorn
 import os
 from fastapi import FastAPI, Request
-from fastapi.responses import FileResponse, HTMLResponse, Response
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
@@ -12,22 +13,99 @@ from starlette.responses import JSONResponse
 from agent.cot_chat import get_cot_chat
 from utils.get_config import config_data
 
-from agent.agent import exe_cot_code, get_cot_code, cot_agent
+from agent.agent import exe_cot_code, get_cot_code, cot_agent, cot_agent_stream
 from agent.summary import get_ans_summary
 from agent.ans_review import get_ans_review
 
+from agent.utils.llm_access.llm_cache import get_llm_cache_stats
+from agent.tools.map.utils.route_cache import get_route_cache_stats
+from agent.tools.map.utils.api_cache import get_api_cache_stats
+from agent.tools.copilot.utils import sandbox
+from agent.tools.prediction.Model_Deploy3 import get_model_info
+from agent.tools.db.spatial_index import warm_spatial_index
+from agent.tools.map.population_api import get_api_catalog
+from agent.utils.pd_to_walker import get_walker_html
+from agent.utils.artifact_store import artifact_store
+from utils.task_pool import run_in_pool, iterate_in_pool, check_admission, get_pool_status, PoolRejected
+
 # DATABASE_URL = config_data['mysql']
 # engine = sqlalchemy.create_engine(DATABASE_URL)
 
 app = FastAPI()
 
+
+@app.on_event("startup")
+async def warm_sandbox():
+    if sandbox.SANDBOX_ENABLED:
+        sandbox.pool.warm()
+    else:
+        # 代码在本进程中执行，预先加载空间索引
+        warm_spatial_index()
+    try:
+        get_api_catalog()
+    except Exception as e:
+        print(f"API catalog not loaded: {e}")
+    artifact_store.start_janitor()
+
+
+@app.on_event("shutdown")
+async def stop_sandbox():
+    sandbox.pool.shutdown()
+    artifact_store.stop_janitor()
+
+
+@app.exception_handler(PoolRejected)
+async def pool_rejected_handler(request: Request, exc: PoolRejected):
+    status = get_pool_status()
+    processed_data = {
+        "ans": "",
+        "type": "error",
+        "msg": exc.msg,
+        "queue_depth": status["queue_depth"],
+        "in_flight": status["in_flight"],
+    }
+    return JSONResponse(content=processed_data, status_code=exc.status_code, headers={"Retry-After": "5"})
+
+
+@app.get("/api/pool-status/")
+async def pool_status(request: Request):
+    return JSONResponse(content={"ans": get_pool_status(), "type": "success", "msg": "处理成功"})
+
+
+@app.get("/api/cache-stats/")
+async def cache_stats(request: Request):
+    processed_data = {
+        "ans": {
+            "llm": get_llm_cache_stats(),
+            "route": get_route_cache_stats(),
+            "api": get_api_cache_stats(),
+            "artifacts": artifact_store.stats(),
+        },
+        "type": "success",
+        "msg": "处理成功"
+    }
+    return JSONResponse(content=processed_data)
+
+
+@app.get("/api/model-info/")
+async def model_info(request: Request):
+    try:
+        info = await run_in_pool("model_info", get_model_info)
+    except PoolRejected:
+        raise
+    except Exception as e:
+        print(f"Model info error: {e}")
+        return JSONResponse(content={"ans": "", "type": "error", "msg": f"模型加载失败: {e}"})
+    return JSONResponse(content={"ans": info, "type": "success", "msg": "处理成功"})
+
+
 STATIC_FOLDER = "tmp_imgs"
 STATIC_PATH = f"/{STATIC_FOLDER}"
-# http://127.0.0.1:8003/tmp_imgs/mlkjcvep.png
-@app.get(f"/{STATIC_FOLDER}/{{filename}}")
+# http://127.0.0.1:8003/tmp_imgs/ml/mlkjcvepabcd.png, or tmp_imgs/mlkjcvep.png for the files before the artifact store
+@app.get(f"/{STATIC_FOLDER}/{{filename:path}}")
 async def read_static_file(request: Request, filename: str):
-    filepath = os.path.join(STATIC_FOLDER, filename)
-    if os.path.isfile(filepath):
+    filepath = artifact_store.open(filename)
+    if filepath:
         # 猜测文件的MIME类型
         content_type, _ = mimetypes.guess_type(filepath)
         if content_type is None:
@@ -41,6 +119,16 @@ async def read_static_file(request: Request, filename: str):
         return {"error": "File not found"}
 
 
+# http://127.0.0.1:8003/walker/<key>.html, the pygwalker page of a DataFrame in an answer
+@app.get("/walker/{filename}")
+async def read_walker_page(request: Request, filename: str):
+    key, _ = os.path.splitext(filename)
+    html = await run_in_pool("walker", get_walker_html, key)
+    if html is None:
+        return JSONResponse(content={"error": "File not found"}, status_code=404)
+    return HTMLResponse(content=html)
+
+
 class AgentInput(BaseModel):
     question: str
 
@@ -53,7 +141,7 @@ class ReviewInput(BaseModel):
 
 @app.post("/api/ask-agent/")
 async def ask_agent(request: Request, user_input: AgentInput):
-    ans, map = cot_agent(user_input.question)
+    ans, map = await run_in_pool("ask_agent", cot_agent, user_input.question)
     print(ans)
     if ans:
         processed_data = {
@@ -74,9 +162,27 @@ async def ask_agent(request: Request, user_input: AgentInput):
     return JSONResponse(content=processed_data)
 
 
+@app.post("/api/ask-agent/stream")
+async def ask_agent_stream(request: Request, user_input: AgentInput):
+    # reject before the response starts, so the client still gets a 429/503 status
+    check_admission("ask_agent")
+
+    async def event_stream():
+        try:
+            async for event, data in iterate_in_pool("ask_agent", cot_agent_stream, user_input.question):
+                if await request.is_disconnected():
+                    break
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except PoolRejected as e:
+            yield f"event: error\ndata: {json.dumps({'msg': e.msg}, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.post("/api/exe-code/")
 async def exe_code(request: Request, user_input: AgentInput):
-    ans = exe_cot_code(user_input.question)
+    ans = await run_in_pool("exe_code", exe_cot_code, user_input.question)
     print(ans)
     if ans:
         processed_data = {
@@ -97,7 +203,7 @@ async def exe_code(request: Request, user_input: AgentInput):
 
 @app.post("/api/get-code/")
 async def get_code(request: Request, user_input: AgentInput):
-    code = get_cot_code(user_input.question)
+    code = await run_in_pool("get_code", get_cot_code, user_input.question)
     print(code)
     if code:
         processed_data = {
@@ -118,7 +224,7 @@ async def get_code(request: Request, user_input: AgentInput):
 
 @app.post("/api/review/")
 async def get_code(request: Request, user_input: ReviewInput):
-    ans = get_ans_review(user_input.question, user_input.ans, user_input.code)
+    ans = await run_in_pool("review", get_ans_review, user_input.question, user_input.ans, user_input.code)
     print(ans)
     if ans:
         processed_data = {
@@ -139,7 +245,7 @@ async def get_code(request: Request, user_input: ReviewInput):
 
 @app.post("/api/agent-summary/")
 async def agent_summary(request: Request, user_input: AgentInput):
-    ans = get_ans_summary(user_input.question)
+    ans = await run_in_pool("agent_summary", get_ans_summary, user_input.question)
     print(ans)
     if ans:
         processed_data = {
@@ -160,7 +266,7 @@ async def agent_summary(request: Request, user_input: AgentInput):
 
 @app.post("/api/cot-chat/")
 async def cot_chat(request: Request, user_input: AgentInput):
-    ans = get_cot_chat(user_input.question)
+    ans = await run_in_pool("cot_chat", get_cot_chat, user_input.question)
     print(ans)
     if ans:
         processed_data = {
@@ -183,7 +289,7 @@ from agent.tools.copilot.utils.read_db import get_rows_from_all_tables
 from agent.tools.tools_def import engine, llm
 @app.post("/api/db-slice/")
 async def db_slice(request: Request):
-    first_five_rows = get_rows_from_all_tables(engine, None, num=5)
+    first_five_rows = await run_in_pool("db_slice", get_rows_from_all_tables, engine, None, num=5)
     from datetime import date, datetime
     def convert_date(obj):
         if isinstance(obj, (date, datetime)):
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from utils.get_config import config_data
+
+pool_config = config_data.get("task_pool") or {}
+
+MAX_WORKERS = int(pool_config.get("max_workers", 8))
+MAX_QUEUE = int(pool_config.get("max_queue", 32))
+ENDPOINT_LIMITS = pool_config.get("endpoint_limits") or {}
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="agent-worker")
+
+_lock = threading.Lock()
+_in_flight = 0
+_endpoint_in_flight = {}
+
+
+class PoolRejected(Exception):
+    """
+    Raised when a task can not be admitted to the pool.
+    status_code is 429 if the endpoint is over its own limit, 503 if the whole pool is saturated.
+    """
+
+    def __init__(self, status_code, msg):
+        super().__init__(msg)
+        self.status_code = status_code
+        self.msg = msg
+
+
+def get_pool_status():
+    with _lock:
+        return {
+            "max_workers": MAX_WORKERS,
+            "max_queue": MAX_QUEUE,
+            "in_flight": _in_flight,
+            "queue_depth": max(0, _in_flight - MAX_WORKERS),
+            "endpoints": {
+                name: {"in_flight": count, "limit": ENDPOINT_LIMITS.get(name)}
+                for name, count in _endpoint_in_flight.items()
+            },
+        }
+
+
+def _check_admission(endpoint):
+    limit = ENDPOINT_LIMITS.get(endpoint)
+    if limit is not None and _endpoint_in_flight.get(endpoint, 0) >= int(limit):
+        raise PoolRejected(429, f"Too many concurrent requests for {endpoint}, please retry later")
+    if _in_flight >= MAX_WORKERS + MAX_QUEUE:
+        raise PoolRejected(503, "Server is busy, please retry later")
+
+
+def check_admission(endpoint):
+    with _lock:
+        _check_admission(endpoint)
+
+
+def acquire_slot(endpoint):
+    global _in_flight
+    with _lock:
+        _check_admission(endpoint)
+        endpoint_count = _endpoint_in_flight.get(endpoint, 0)
+        _in_flight += 1
+        _endpoint_in_flight[endpoint] = endpoint_count + 1
+
+
+def release_slot(endpoint):
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+        _endpoint_in_flight[endpoint] = _endpoint_in_flight.get(endpoint, 1) - 1
+
+
+async def run_in_pool(endpoint, func, *args, **kwargs):
+    """
+    Run a blocking function in the worker pool without blocking the event loop.
+    Raise PoolRejected when the endpoint limit or the pool queue is full.
+    """
+    acquire_slot(endpoint)
+    try:
+        future = executor.submit(partial(func, *args, **kwargs))
+    except Exception:
+        release_slot(endpoint)
+        raise
+    # released when func returns, not when the await is cancelled, so the slot counts the thread's real work
+    future.add_done_callback(lambda _: release_slot(endpoint))
+    return await asyncio.wrap_future(future)
+
+
+_DONE = object()
+
+
+async def iterate_in_pool(endpoint, gen_func, *args, **kwargs):
+    """
+    Drive a blocking generator in the worker pool, one next() per pool task, and yield its items.
+    The slot is held until the generator is exhausted or the consumer stops.
+    """
+    acquire_slot(endpoint)
+    gen = None
+    future = None
+    try:
+        gen = gen_func(*args, **kwargs)
+        while True:
+            future = executor.submit(next, gen, _DONE)
+            item = await asyncio.wrap_future(future)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        def finish(_=None):
+            if gen is not None:
+                try:
+                    gen.close()
+                except Exception as e:
+                    print(f"Error closing {endpoint} generator: {e}")
+            release_slot(endpoint)
+
+        def finish_in_pool(_=None):
+            # closing the generator runs its cleanup, e.g. killing a sandbox worker, keep it off the event loop
+            try:
+                executor.submit(finish)
+            except RuntimeError:
+                # the executor is shut down
+                finish()
+
+        if future is not None and not future.done():
+            # next() is still running in a worker thread after the consumer was cancelled,
+            # close the generator and free the slot once it returns
+            future.add_done_callback(finish_in_pool)
+        else:
+            finish_in_pool()